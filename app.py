@@ -1,11 +1,12 @@
 import os
-import json
 import base64
+import threading
+import db_manager
 import drive_auth  # Authentication and service builder
 import drive_assistant_v2 as drive_assistant  # New logic using native API
 import requests
 import re  # For better command parsing
-from flask import Flask, request, make_response, Response # Added Response and make_response
+from flask import Flask, request, make_response
 
 app = Flask(__name__)
 
@@ -14,6 +15,10 @@ PUBLIC_URL = os.getenv('PUBLIC_URL', 'http://localhost:5000')
 TEMP_DIR = os.getenv('TEMP_DIR', '/tmp')
 TEMP_FILE_PATH = os.path.join(TEMP_DIR, 'upload_temp')
 
+# Twilio credentials for fetching attached media (read once, not on every upload)
+TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
+TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
+
 # Get your OpenAI API Key and Model Name from environment variables
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', 'default-key')
 OPENAI_MODEL_NAME = os.getenv('OPENAI_MODEL_NAME', 'gpt-3.5-turbo')
@@ -44,6 +49,25 @@ def get_drive_service(user_id):
     return service, auth_error
 
 
+def warm_known_users():
+    """
+    Prefetches the Drive tokens of every user in the local user store (one batched Firestore read),
+    so their first message after a restart doesn't wait on a token lookup.
+    """
+    try:
+        numbers = db_manager.get_user_numbers()
+    except Exception as e:
+        print(f"Could not read known users for token warm-up: {e}")
+        return
+    # The store keeps Twilio's 'whatsapp:+<number>' form; token documents are keyed by the bare WaId
+    user_ids = [number.removeprefix('whatsapp:').lstrip('+') for number in numbers]
+    drive_auth.warm_token_cache(user_ids)
+
+
+# Warmed in the background, so importing the app (e.g. gunicorn app:app) doesn't wait on Firestore
+threading.Thread(target=warm_known_users, name='token-warmup', daemon=True).start()
+
+
 # --- Flask Routes ---
 
 @app.route("/oauth/callback", methods=["GET"])
@@ -66,6 +90,8 @@ def oauth_callback():
             return f"Authorization failed: {error}", 500
 
         drive_auth.store_credentials(user_id, credentials)
+        # Make sure the token is in Firestore before the user's next message, which another worker may handle
+        drive_auth.flush_credentials()
 
         # Success page
         return """
@@ -134,7 +160,7 @@ def whatsapp_message():
 
         print(f"[{user_id}] Fetching media from URL: {media_url}")
 
-        media_response = requests.get(media_url, auth=(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN')))
+        media_response = requests.get(media_url, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
 
         if media_response.status_code != 200:
             return send_whatsapp_response(
@@ -258,5 +284,5 @@ def whatsapp_message():
 
 
 if __name__ == '__main__':
-    drive_auth.write_secrets_to_file()
+    drive_auth.eager_init()
     app.run(debug=True, host='0.0.0.0', port=os.environ.get('PORT', 5000))
@@ -1,13 +1,17 @@
 import sqlite3
 import os
+import time
 
 # Determine the database path: use /tmp/ in production (like Render),
 # and the current directory (.) locally.
 DATABASE_PATH = os.path.join(os.getenv('TEMP_DIR', '.'), 'user_creds.db') 
 
+# Stored folder summaries older than this are dropped the next time a summary is saved
+SUMMARY_MAX_AGE = 30 * 24 * 3600  # 30 days
+
 
 def init_db():
-    """Initializes the SQLite database and the users table."""
+    """Initializes the SQLite database and the users and summaries tables."""
     try:
         conn = sqlite3.connect(DATABASE_PATH)
         cursor = conn.cursor()
@@ -17,6 +21,13 @@ def init_db():
                 refresh_token TEXT NOT NULL
             )
         """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
         conn.commit()
         conn.close()
     except Exception as e:
@@ -48,3 +59,40 @@ def get_user_token(whatsapp_number):
     result = cursor.fetchone()
     conn.close()
     return result[0] if result else None
+
+
+def get_user_numbers():
+    """Retrieves the WhatsApp numbers of every user with a stored token."""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT whatsapp_number FROM users")
+    result = cursor.fetchall()
+    conn.close()
+    return [row[0] for row in result]
+
+
+def save_summary(key, summary):
+    """Saves a folder summary under its content key, pruning summaries older than SUMMARY_MAX_AGE."""
+    now = time.time()
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT OR REPLACE INTO summaries (key, summary, created_at) VALUES (?, ?, ?)",
+        (key, summary, now)
+    )
+    cursor.execute("DELETE FROM summaries WHERE created_at < ?", (now - SUMMARY_MAX_AGE,))
+    conn.commit()
+    conn.close()
+
+
+def get_summary(key):
+    """Retrieves a stored folder summary by its content key."""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT summary FROM summaries WHERE key = ?",
+        (key,)
+    )
+    result = cursor.fetchone()
+    conn.close()
+    return result[0] if result else None
@@ -1,12 +1,45 @@
 import os
 import io
-import requests
+import time
+import random
+import atexit
+import hashlib
+import threading
+import asyncio
+import aiohttp
 import json
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+import zipfile
+import google_auth_httplib2
+from cachetools import TTLCache
+from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload, build_http
 from googleapiclient.errors import HttpError
-from openai import OpenAI
-from google.oauth2.credentials import Credentials
-from mimetypes import MimeTypes
+from xml.etree import ElementTree
+import mimetypes
+import db_manager
+
+
+# Public surface of the Drive assistant (imported by app.py as `drive_assistant`)
+__all__ = [
+    'EXPORTABLE_MIMETYPES',
+    'get_folder_id',
+    'get_folder_ids',
+    'get_file_id_by_name_and_path',
+    'get_file_by_name_anywhere',
+    'list_files',
+    'delete_file',
+    'delete_files',
+    'move_file',
+    'move_files',
+    'rename_file',
+    'upload_file',
+    'download_file',
+    'stream_folder_summary',
+    'summarize_folder',
+]
+
+
+# MimeType Drive uses for folders (shared by every folder/file query below)
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
 
 
 # --- Configuration for Summarization ---
@@ -19,87 +52,656 @@ EXPORTABLE_MIMETYPES = [
     'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',  # XLSX
     'application/pdf',  # PDF
     'text/plain', # TXT
+    'text/csv',  # CSV
+    'text/markdown',  # Markdown
+    'application/json',  # JSON
 ]
 
+# Drive's q syntax has no "mimeType in (...)", so the OR group is built once here
+EXPORTABLE_MIMETYPES_QUERY = '(' + ' or '.join(f"mimeType = '{m}'" for m in EXPORTABLE_MIMETYPES) + ')'
+
+# Summary downloads go straight to the Drive REST endpoint, this many at a time
+DRIVE_FILES_URL = 'https://www.googleapis.com/drive/v3/files'
+SUMMARY_DOWNLOAD_CONCURRENCY = 8
+# API-client fallback downloads run on asyncio.to_thread workers; each worker thread keeps one keep-alive
+# httplib2.Http (httplib2 is not thread-safe), so later fallbacks skip the TCP/TLS handshake
+_worker_http = threading.local()
+# Only the head of each file can reach the prompt, so downloads are capped at this many bytes
+SUMMARY_MAX_FILE_BYTES = 1024 * 1024
+# DOCX/XLSX/PDF can't be read from a partial download, so they are fetched whole; larger ones are skipped
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PDF_MIMETYPE = 'application/pdf'
+SUMMARY_DOCUMENT_MIMETYPES = {DOCX_MIMETYPE, XLSX_MIMETYPE, PDF_MIMETYPE}
+SUMMARY_MAX_DOCUMENT_BYTES = 10 * 1024 * 1024
+# A SUMMARY reads only the most recently modified files of a folder, so one webhook request stays bounded
+# in downloads and model calls however large the folder is
+SUMMARY_MAX_FILES = 40
+
+# OpenAI clients reused across SUMMARY requests (keeps the HTTP connection pool warm): {api_key: client}
+_openai_clients = {}
+
+# Prompt size limits: the whole prompt fits comfortably in the default gpt-3.5-turbo context, and no single
+# file may take more than its share of the total, nor more than the per-file cap (long files keep their head and tail)
+SUMMARY_TOTAL_CHAR_BUDGET = 20000
+SUMMARY_PER_FILE_CHAR_BUDGET = 8000
+
+# Folders whose text doesn't fit the prompt budget are map-reduced: each file is first condensed on its own,
+# on a smaller and faster model (several at a time), and the final summary is written from those condensed notes
+SUMMARY_MAP_MODEL = 'gpt-4o-mini'
+SUMMARY_MAP_WORDS = 60
+SUMMARY_MAP_CONCURRENCY = 8
+SUMMARY_MAP_FILE_CHAR_BUDGET = 48000  # text per file given to the map step (head and tail of longer files)
+# Room one condensed note takes in the final prompt (SUMMARY_MAP_WORDS words plus its FILE header); only as many
+# files as fit SUMMARY_TOTAL_CHAR_BUDGET at that size are condensed, so no map call is made for a note that would be cut
+SUMMARY_MAP_NOTE_CHARS = 500
+SUMMARY_MAP_MAX_DOCUMENTS = SUMMARY_TOTAL_CHAR_BUDGET // SUMMARY_MAP_NOTE_CHARS
+
+# Finished summaries keyed by a digest of (folder_id, model, each file's id + md5Checksum/modifiedTime).
+# Kept in memory for an hour and in the SQLite store (db_manager), which all workers share and which survives restarts.
+_summary_cache = TTLCache(maxsize=256, ttl=3600)
+_summary_cache_lock = threading.Lock()  # cachetools caches aren't thread-safe
+_summary_store_ready = False
+
+
+# --- Configuration for Listing ---
+# Items shown in a LIST reply (the Drive listing itself is fetched in pages of the maximum size, 1000)
+LIST_DISPLAY_LIMIT = 50
+
+# Label shown in front of each LIST entry, by exact MIME type, then by MIME prefix.
+# Plain ASCII on purpose: send_whatsapp_response strips anything non-ASCII from replies.
+MIME_LABELS = {
+    FOLDER_MIMETYPE: '[FOLDER]',
+    'application/pdf': '[PDF]',
+    'application/vnd.google-apps.document': '[DOC]',
+    'application/vnd.google-apps.spreadsheet': '[SHEET]',
+    'application/vnd.google-apps.presentation': '[SLIDES]',
+}
+MIME_PREFIX_LABELS = {
+    'image': '[IMAGE]',
+    'video': '[VIDEO]',
+    'audio': '[AUDIO]',
+}
+
+
+# --- Configuration for Uploads ---
+# Static extension table for the media types WhatsApp users typically send;
+# anything else falls back to the stdlib's shared mimetypes database.
+_EXT_MIME = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.mp4': 'video/mp4',
+    '.mp3': 'audio/mpeg',
+    '.ogg': 'audio/ogg',
+    '.pdf': 'application/pdf',
+    '.txt': 'text/plain',
+    '.csv': 'text/csv',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+mimetypes.init()  # Load the system MIME maps once, at import, rather than on the first upload
+
+# Files above this size use a chunked resumable session; smaller ones go up in a single multipart request
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024  # 5 MB
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8 MB per resumable chunk
+
+
+# download_file fetches files larger than one range as this many concurrent byte ranges
+DOWNLOAD_RANGE_BYTES = 16 * 1024 * 1024  # 16 MB
+DOWNLOAD_RANGE_CONCURRENCY = 8
+
+# Same-named files read when a file is looked up by name alongside its folder (more means a direct in-folder search)
+FILE_NAME_SEARCH_PAGE_SIZE = 100
+
+# Drive calls are retried this many times on 429/5xx (and rate-limit 403s), with exponential backoff.
+# Single requests use the client library's num_retries; batched requests are retried by _execute_batch.
+DRIVE_NUM_RETRIES = 3
+_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+DRIVE_MAX_RETRY_DELAY = 30  # seconds
+
+# Drive answers large batches of writes with 500s, so deletes/moves go out this many per batch request
+MUTATION_BATCH_SIZE = 25
+
+
+# --- Folder ID Cache ---
+# Resolved folder paths per Drive user: {(user_key, 'reports/q3'): folder_id or None}
+# Misses are cached too, so a mistyped path doesn't cost a round trip per retry.
+# Least recently used paths are evicted beyond FOLDER_ID_CACHE_SIZE entries.
+FOLDER_ID_CACHE_SIZE = 1024
+FOLDER_ID_CACHE_TTL = 600  # seconds; the Drive changes feed catches folder edits sooner (see below)
+_folder_id_cache = TTLCache(maxsize=FOLDER_ID_CACHE_SIZE, ttl=FOLDER_ID_CACHE_TTL)
+_CACHE_MISS = object()
+# Position in each user's Drive changes feed: {user_key: (page_token, polled_at)}
+# Before cached IDs are served, the feed is read (at most once per interval) and any folder change drops them.
+# A position not polled for FOLDER_ID_CACHE_TTL is restarted rather than replayed (the IDs it guarded have expired),
+# and a feed with more than FOLDER_CHANGES_MAX_PAGES pages of changes just drops the user's cached IDs.
+FOLDER_CHANGES_POLL_INTERVAL = 15  # seconds
+FOLDER_CHANGES_MAX_PAGES = 5
+_folder_changes_tokens = {}
+# Guards _folder_id_cache and _folder_changes_tokens (cachetools caches aren't thread-safe); never held over a Drive call
+_folder_cache_lock = threading.Lock()
+# Pages of the single name-match folder listing read before walking the path level by level instead
+FOLDER_QUERY_MAX_PAGES = 5
+# The real ID behind the 'root' alias never changes, so it is cached without expiry: {user_key: root_id}
+_root_id_cache = {}
+
 
 # --- Helper Functions ---
 
-def get_folder_id(drive_service, folder_path):
+# Translation table removing ASCII control characters from query values
+_CONTROL_CHARS = dict.fromkeys([*range(32), 127])
+
+
+def _q(value):
     """
-    Finds the ID of the folder based on its path (e.g., 'Reports/Q3/2025').
-    Returns the folder ID (string) or None if any segment of the path is not found.
+    Escapes a user-supplied value for use inside a single-quoted Drive query literal
+    (e.g. "O'Brien report.pdf"), so the query neither fails to parse nor matches the wrong name.
+    Control characters (which Drive names can't contain) are dropped instead of being sent through.
     """
-    current_parent_id = 'root'  # Start from the root of Google Drive
+    value = value.translate(_CONTROL_CHARS)
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+
+def _split_folder_path(folder_path):
+    """Splits a folder path into its non-empty, stripped segments (each segment is stripped once)."""
+    return [name for name in map(str.strip, folder_path.split('/')) if name]
+
+
+def _folder_cache_path(folder_names):
+    """
+    Cache key for a split folder path. Case-insensitive, like Drive's name = '...' matching
+    (app.py upper-cases slash-command arguments before they get here).
+    """
+    return '/'.join(folder_names).casefold()
+
+
+def _cache_user_key(drive_service):
+    """
+    Identifies the Drive user behind a service object for the folder ID cache.
+    A new service is built for every message, so the user's refresh token is used rather than the object itself
+    (hashed, so the caches don't hold raw tokens).
+    """
+    credentials = getattr(getattr(drive_service, '_http', None), 'credentials', None)
+    refresh_token = getattr(credentials, 'refresh_token', None)
+    if not refresh_token:
+        return id(drive_service)
+    return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+
+def invalidate_folder_cache(drive_service, folder_path):
+    """
+    Drops cached IDs for folder_path and every path below it for this user.
+    Called whenever a folder is removed, so a stale ID is never handed back.
+    """
+    user_key = _cache_user_key(drive_service)
+    prefix = _folder_cache_path(_split_folder_path(folder_path))
+    with _folder_cache_lock:
+        for key in list(_folder_id_cache):
+            cached_user, cached_path = key
+            if cached_user == user_key and (cached_path == prefix or cached_path.startswith(prefix + '/')):
+                _folder_id_cache.pop(key, None)
+
+
+def _clear_user_folder_cache(user_key):
+    """Drops every cached folder path for one user."""
+    with _folder_cache_lock:
+        for key in list(_folder_id_cache):
+            if key[0] == user_key:
+                _folder_id_cache.pop(key, None)
+
+
+def _changes_feed_position(user_key):
+    """
+    The user's live changes-feed position (page_token, polled_at), or None when there is none or it
+    hasn't been polled for FOLDER_ID_CACHE_TTL seconds (replaying days of changes costs more than restarting).
+    """
+    with _folder_cache_lock:
+        state = _folder_changes_tokens.get(user_key)
+    if state is not None and time.monotonic() - state[1] > FOLDER_ID_CACHE_TTL:
+        return None
+    return state
+
+
+def _drop_changes_feed(user_key):
+    """Forgets the user's changes-feed position along with the cached IDs it was guarding."""
+    with _folder_cache_lock:
+        _folder_changes_tokens.pop(user_key, None)
+    _clear_user_folder_cache(user_key)
+
+
+def _start_changes_feed(user_key, token_response, token_error):
+    """
+    Records a new changes-feed position from a getStartPageToken response, first dropping the user's cached IDs
+    (changes before this position will never be read, so IDs cached earlier couldn't be checked).
+    Returns True if the feed was started.
+    """
+    _drop_changes_feed(user_key)
+    if token_error is not None:
+        return False
+    with _folder_cache_lock:
+        _folder_changes_tokens[user_key] = (token_response['startPageToken'], time.monotonic())
+    return True
+
+
+def _sync_folder_changes(drive_service, user_key):
+    """
+    Reads the user's Drive changes feed since the last poll and drops their cached folder IDs
+    if any folder was created, renamed, moved, trashed or deleted in the meantime (from any client).
+    Polls at most once per FOLDER_CHANGES_POLL_INTERVAL seconds.
+    """
+    state = _changes_feed_position(user_key)
+    if state is None:
+        # No (recent) feed position to check the cached IDs against, so they can't be trusted
+        _drop_changes_feed(user_key)
+        return
+
+    page_token, polled_at = state
+    if time.monotonic() - polled_at < FOLDER_CHANGES_POLL_INTERVAL:
+        return
+
+    with _folder_cache_lock:
+        cached_ids = {_folder_id_cache.get(key) for key in list(_folder_id_cache) if key[0] == user_key}
+    folder_changed = False
+    pages = 0
+    try:
+        while True:
+            if pages == FOLDER_CHANGES_MAX_PAGES:
+                # Too much has changed to be worth reading through; the feed restarts with the next lookup
+                _drop_changes_feed(user_key)
+                return
+            pages += 1
+            results = drive_service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(mimeType))",
+                pageSize=1000
+            ).execute(num_retries=DRIVE_NUM_RETRIES)
+            for change in results.get('changes', []):
+                if change.get('removed'):
+                    # Permanently deleted or no longer visible; the mimeType isn't reported any more
+                    folder_changed = folder_changed or change.get('fileId') in cached_ids
+                elif change.get('file', {}).get('mimeType') == FOLDER_MIMETYPE:
+                    folder_changed = True
+            if 'newStartPageToken' in results:
+                page_token = results['newStartPageToken']
+                break
+            page_token = results['nextPageToken']
+    except Exception as e:
+        print(f"Could not read the Drive changes feed, dropping cached folder IDs: {e}")
+        _drop_changes_feed(user_key)
+        return
+
+    with _folder_cache_lock:
+        _folder_changes_tokens[user_key] = (page_token, time.monotonic())
+    if folder_changed:
+        _clear_user_folder_cache(user_key)
+
+
+def _get_root_id(drive_service):
+    """Returns the real ID of the user's My Drive root (parents lists carry this ID, not the 'root' alias)."""
+    user_key = _cache_user_key(drive_service)
+    root_id = _root_id_cache.get(user_key)
+    if root_id is None:
+        root_id = drive_service.files().get(fileId='root', fields='id').execute(num_retries=DRIVE_NUM_RETRIES)['id']
+        _root_id_cache[user_key] = root_id
+    return root_id
+
+
+def _folder_query_request(drive_service, folder_names):
+    """
+    Builds the single files().list request a folder path is resolved from:
+    a direct child lookup under the root for one segment, or, for nested paths,
+    every folder named like one of the segments (the parent chain is then walked locally).
+    """
+    if len(folder_names) == 1:
+        query = (
+            f"'root' in parents and "
+            f"name = '{_q(folder_names[0])}' and "
+            f"mimeType = '{FOLDER_MIMETYPE}' and "
+            "trashed = false"
+        )
+        return drive_service.files().list(
+            q=query,
+            fields="files(id)",
+            spaces='drive',
+            pageSize=1  # Only the first match is used
+        )
+
+    name_clauses = ' or '.join(f"name = '{_q(name)}'" for name in dict.fromkeys(folder_names))
+    query = (
+        f"({name_clauses}) and "
+        f"mimeType = '{FOLDER_MIMETYPE}' and "
+        "trashed = false"
+    )
+    return drive_service.files().list(
+        q=query,
+        fields="nextPageToken, files(id, name, parents)",
+        spaces='drive',
+        pageSize=1000
+    )
+
+
+def _folder_id_from_listing(drive_service, folder_names, results):
+    """
+    Resolves a path from the response to _folder_query_request.
+    Further pages of a large listing are fetched (up to FOLDER_QUERY_MAX_PAGES in all).
+    Returns None when a segment has no match in the complete listing.
+    Falls back to the per-level walk when the listing can't answer unambiguously
+    (duplicate names under one parent, or a listing still truncated).
+    """
+    folders = list(results.get('files', []))
+
+    if len(folder_names) == 1:
+        return folders[0]['id'] if folders else None
+
+    request = None
+    pages = 1
+    while results.get('nextPageToken'):
+        if pages >= FOLDER_QUERY_MAX_PAGES:
+            return _lookup_folder_id_by_level(drive_service, folder_names)
+        # list_next only needs an equivalent request to carry the page token forward
+        request = drive_service.files().list_next(
+            request or _folder_query_request(drive_service, folder_names), results
+        )
+        results = request.execute(num_retries=DRIVE_NUM_RETRIES)
+        folders.extend(results.get('files', []))
+        pages += 1
+
+    current_parent_id = _get_root_id(drive_service)
+
+    for folder_name in folder_names:
+        matches = [
+            folder['id'] for folder in folders
+            if folder['name'].casefold() == folder_name.casefold() and current_parent_id in folder.get('parents', [])
+        ]
+        if not matches:
+            return None
+        if len(matches) > 1:
+            return _lookup_folder_id_by_level(drive_service, folder_names)
+        current_parent_id = matches[0]
 
-    # Split the path, removing any leading/trailing slashes
-    folder_names = [name.strip() for name in folder_path.split('/') if name.strip()]
+    return current_parent_id
 
-    if not folder_names:
-        return 'root'
+
+def _lookup_folder_id_by_level(drive_service, folder_names):
+    """
+    Walks the folder segments from the Drive root, one files().list call per segment.
+    Returns the folder ID or None if a segment doesn't exist; API errors propagate to the caller.
+    """
+    current_parent_id = 'root'  # Start from the root of Google Drive
 
     for folder_name in folder_names:
         # Search for the current folder name within the current parent ID
         query = (
             f"'{current_parent_id}' in parents and "
-            f"name = '{folder_name}' and "
-            f"mimeType = 'application/vnd.google-apps.folder' and "
+            f"name = '{_q(folder_name)}' and "
+            f"mimeType = '{FOLDER_MIMETYPE}' and "
             "trashed = false"
         )
+        results = drive_service.files().list(
+            q=query,
+            fields="files(id)",
+            spaces='drive',
+            pageSize=1  # Only the first match is used
+        ).execute(num_retries=DRIVE_NUM_RETRIES)
+
+        items = results.get('files', [])
+        if not items:
+            # Folder not found at this level
+            return None
+
+        # Update parent ID for the next segment of the path
+        current_parent_id = items[0]['id']
+
+    # After iterating through all path segments, current_parent_id is the final folder ID
+    return current_parent_id
+
+
+def _is_retryable(exception):
+    """True for Drive errors worth retrying: rate limiting (429) and server-side failures (5xx)."""
+    return isinstance(exception, HttpError) and exception.resp.status in _RETRYABLE_STATUSES
+
+
+def _is_transient(exception):
+    """
+    True for download failures that may not happen again: retryable Drive statuses and network errors.
+    Files that can't be exported or parsed fail the same way every time.
+    """
+    if isinstance(exception, HttpError):
+        return _is_retryable(exception)
+    if isinstance(exception, aiohttp.ClientResponseError):
+        return exception.status in _RETRYABLE_STATUSES
+    return isinstance(exception, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+
+def _retry_delay(attempt, errors):
+    """
+    Seconds to wait before retry number attempt + 1: the longest Retry-After the errors asked for,
+    otherwise exponential backoff with jitter (capped at DRIVE_MAX_RETRY_DELAY).
+    """
+    retry_after = [error.resp.get('retry-after', '') for error in errors]
+    requested = [int(value) for value in retry_after if value.isdigit()]
+    if requested:
+        return min(max(requested), DRIVE_MAX_RETRY_DELAY)
+    return min(2 ** attempt + random.random(), DRIVE_MAX_RETRY_DELAY)
+
+
+def _execute_batch(drive_service, batch_requests, batch_size=100):
+    """
+    Sends independent Drive requests together as multipart batches (at most batch_size per batch)
+    instead of one HTTP round trip each.
+    Returns one (response, exception) pair per request, in the order given.
+    """
+    if len(batch_requests) == 1:
+        # A lone request goes out as is, without the multipart wrapping
         try:
-            results = drive_service.files().list(
-                q=query,
-                fields="files(id, name)",
-                spaces='drive'
-            ).execute()
-
-            items = results.get('files', [])
-            if not items:
-                # Folder not found at this level
-                return None
-                
-            # Update parent ID for the next segment of the path
-            current_parent_id = items[0]['id']
+            return [(batch_requests[0].execute(num_retries=DRIVE_NUM_RETRIES), None)]
         except HttpError as e:
-            print(f"Drive API Error during folder search for '{folder_name}': {e}")
-            return None
+            return [(None, e)]
+
+    outcomes = [(None, None)] * len(batch_requests)
+
+    def _on_response(request_id, response, exception):
+        outcomes[int(request_id)] = (response, exception)
+
+    # Requests that fail with a retryable status are sent again (in a new batch) after a backoff
+    pending = list(range(len(batch_requests)))
+    for attempt in range(DRIVE_NUM_RETRIES + 1):
+        for start in range(0, len(pending), batch_size):
+            batch = drive_service.new_batch_http_request(callback=_on_response)
+            for index in pending[start:start + batch_size]:
+                batch.add(batch_requests[index], request_id=str(index))
+            batch.execute()
+
+        pending = [index for index in pending if _is_retryable(outcomes[index][1])]
+        if not pending or attempt == DRIVE_NUM_RETRIES:
+            break
+        time.sleep(_retry_delay(attempt, [outcomes[index][1] for index in pending]))
+
+    return outcomes
+
+
+def _iter_files(drive_service, first_page=None, **list_kwargs):
+    """
+    Runs a files().list query and yields its file records, fetching the next page (nextPageToken,
+    which list_kwargs['fields'] must include) only when the caller reads past the current one.
+    first_page, if given, is the query's first page as already fetched (e.g. as part of a batch).
+    """
+    request = drive_service.files().list(**list_kwargs)
+    while request is not None:
+        results = first_page if first_page is not None else request.execute(num_retries=DRIVE_NUM_RETRIES)
+        first_page = None
+        yield from results.get('files', [])
+        request = drive_service.files().list_next(request, results)
+
+
+def _list_all_files(drive_service, **list_kwargs):
+    """Runs a files().list query and follows nextPageToken until every page is read. Returns all the file records."""
+    return list(_iter_files(drive_service, **list_kwargs))
+
+
+def _remember_child_folders(drive_service, folder_path, items):
+    """
+    Seeds the folder ID cache with the subfolders found while listing folder_path,
+    so a follow-up command on one of them (e.g. LIST / then LIST /Reports) needs no lookup.
+    Names that appear more than once are skipped, since a lookup might pick a different one.
+    Only call this while the user's changes feed is followed, or the seeds are dropped on first use.
+    """
+    parent_names = _split_folder_path(folder_path)
+    child_names = [item['name'].strip().casefold() for item in items if item.get('mimeType') == FOLDER_MIMETYPE]
+    user_key = _cache_user_key(drive_service)
+
+    seeds = {}
+    for item in items:
+        if item.get('mimeType') != FOLDER_MIMETYPE:
+            continue
+        name = item['name'].strip()
+        if name and child_names.count(name.casefold()) == 1:
+            seeds[(user_key, _folder_cache_path(parent_names + [name]))] = item['id']
+    with _folder_cache_lock:
+        _folder_id_cache.update(seeds)
+
+
+def get_folder_id(drive_service, folder_path):
+    """
+    Finds the ID of the folder based on its path (e.g., 'Reports/Q3/2025').
+    Returns the folder ID (string) or None if any segment of the path is not found.
+    Results are cached per user until a folder changes in their Drive (or FOLDER_ID_CACHE_TTL passes).
+    """
+    return get_folder_ids(drive_service, [folder_path])[0]
+
+
+def get_folder_ids(drive_service, folder_paths):
+    """
+    Resolves several folder paths at once, returning their IDs (or None) in the same order.
+    Cache hits cost at most one changes-feed poll per FOLDER_CHANGES_POLL_INTERVAL;
+    the lookups for all misses go out together in one batch request.
+    """
+    return _get_folder_ids_with(drive_service, folder_paths)[0]
+
+
+def _get_folder_ids_with(drive_service, folder_paths, extra_requests=()):
+    """
+    get_folder_ids, plus independent extra requests sent in the same batch as the folder lookups.
+    Returns (folder IDs, one (response, exception) pair per extra request).
+    """
+    extra_requests = list(extra_requests)
+    user_key = _cache_user_key(drive_service)
+    folder_ids = [None] * len(folder_paths)
+    misses = []  # (position, folder_names, cache_key)
+    synced = False
+
+    for position, folder_path in enumerate(folder_paths):
+        # Split the path, removing any leading/trailing slashes
+        folder_names = _split_folder_path(folder_path)
+
+        if not folder_names:
+            folder_ids[position] = 'root'
+            continue
+
+        cache_key = (user_key, _folder_cache_path(folder_names))
+        if not synced:
+            with _folder_cache_lock:
+                is_cached = cache_key in _folder_id_cache
+            if is_cached:
+                # Before serving cached IDs, check that no folder changed since they were looked up
+                _sync_folder_changes(drive_service, user_key)
+                synced = True
+
+        with _folder_cache_lock:
+            cached = _folder_id_cache.get(cache_key, _CACHE_MISS)
+        if cached is _CACHE_MISS:
+            misses.append((position, folder_names, cache_key))
+        else:
+            folder_ids[position] = cached
+
+    if not misses and not extra_requests:
+        return folder_ids, []
+
+    start_feed = bool(misses) and _changes_feed_position(user_key) is None
+    try:
+        lookups = [_folder_query_request(drive_service, folder_names) for _, folder_names, _ in misses]
+        if start_feed:
+            # Start following the changes feed along with these lookups, so their results can be checked later
+            lookups.append(drive_service.changes().getStartPageToken(fields='startPageToken'))
+        outcomes = _execute_batch(drive_service, lookups + extra_requests)
+    except Exception as e:
+        print(f"Unexpected Error during folder search: {e}")
+        return folder_ids, [(None, e)] * len(extra_requests)
+
+    extra_outcomes = outcomes[len(lookups):]
+    outcomes = outcomes[:len(lookups)]
+
+    if start_feed:
+        _start_changes_feed(user_key, *outcomes.pop())
+
+    for (position, folder_names, cache_key), (results, exception) in zip(misses, outcomes):
+        folder_path = '/'.join(folder_names)
+        if exception is not None:
+            print(f"Drive API Error during folder search for '{folder_path}': {exception}")
+            continue
+        try:
+            folder_id = _folder_id_from_listing(drive_service, folder_names, results)
+        except HttpError as e:
+            print(f"Drive API Error during folder search for '{folder_path}': {e}")
+            continue
         except Exception as e:
             print(f"Unexpected Error during folder search: {e}")
-            return None
+            continue
 
-    # After iterating through all path segments, current_parent_id is the final folder ID
-    return current_parent_id
+        with _folder_cache_lock:
+            _folder_id_cache[cache_key] = folder_id
+        folder_ids[position] = folder_id
+
+    return folder_ids, extra_outcomes
 
 
-def get_file_id_by_name_and_path(drive_service, parent_folder_path, file_name):
+def get_file_id_by_name_and_path(drive_service, parent_folder_path, file_name, parent_id=None):
     """
     Finds a file ID given its parent folder path and exact file name.
+    Pass parent_id when the caller has already resolved the folder, to skip resolving it again.
     Returns the file ID (string) and None for error, or None and an error message.
     """
-    parent_id = get_folder_id(drive_service, parent_folder_path)
+    item, error = _find_file_in_folder(drive_service, parent_folder_path, file_name, parent_id)
+    return (item['id'] if item else None), error
+
+
+def _find_file_in_folder(drive_service, parent_folder_path, file_name, parent_id=None):
+    """
+    Like get_file_id_by_name_and_path, but returns the file record ({'id', 'parents'}) instead of just its ID,
+    so callers that modify the file's parents don't need to fetch them separately.
+    """
+    if parent_id is None:
+        parent_id = get_folder_id(drive_service, parent_folder_path)
     if not parent_id:
         # Parent folder not found
         return None, f"Parent folder '{parent_folder_path}' not found."
 
     query = (
         f"'{parent_id}' in parents and "
-        f"name = '{file_name}' and "
+        f"name = '{_q(file_name)}' and "
         "trashed = false and "
         # Exclude folders, we are looking for a file
-        "mimeType != 'application/vnd.google-apps.folder'" 
+        f"mimeType != '{FOLDER_MIMETYPE}'"
     )
     
     try:
         results = drive_service.files().list(
             q=query,
-            fields="files(id, name, mimeType)",
-            spaces='drive'
-        ).execute()
+            fields="files(id, parents)",
+            spaces='drive',
+            pageSize=1  # Only the first match is used
+        ).execute(num_retries=DRIVE_NUM_RETRIES)
 
         items = results.get('files', [])
         if not items:
             return None, f"File '{file_name}' not found in folder '{parent_folder_path}'."
             
-        return items[0]['id'], None
+        return items[0], None
 
     except HttpError as e:
         return None, f"Drive API Error during file search: {e}"
@@ -107,6 +709,41 @@ def get_file_id_by_name_and_path(drive_service, parent_folder_path, file_name):
         return None, f"Unexpected Error during file search: {e}"
 
 
+def _resolve_file_and_folders(drive_service, parent_folder_path, file_name, other_folder_paths):
+    """
+    Resolves parent_folder_path and other_folder_paths, and finds file_name inside the parent folder,
+    without waiting for the parent's ID first: the file is searched for by name in the same batch
+    as the folder lookups, then matched to the parent by ID. Falls back to the in-folder search when
+    that can't decide (a very common name, an unknown root ID, or a failed search).
+    Returns (folder IDs with the parent first, the file record ({'id', 'parents'}) or None, error message or None).
+    """
+    name_search = drive_service.files().list(
+        q=f"name = '{_q(file_name)}' and mimeType != '{FOLDER_MIMETYPE}' and trashed = false",
+        fields="nextPageToken, files(id, parents)",
+        spaces='drive',
+        pageSize=FILE_NAME_SEARCH_PAGE_SIZE
+    )
+    folder_ids, [(found, search_error)] = _get_folder_ids_with(
+        drive_service, [parent_folder_path] + list(other_folder_paths), [name_search]
+    )
+
+    parent_id = folder_ids[0]
+    if not parent_id:
+        # Parent folder not found
+        return folder_ids, None, f"Parent folder '{parent_folder_path}' not found."
+
+    # parents lists carry the root's real ID, not the 'root' alias; if that isn't known yet, the in-folder search decides
+    match_id = _root_id_cache.get(_cache_user_key(drive_service)) if parent_id == 'root' else parent_id
+    if found is not None and not found.get('nextPageToken') and match_id:
+        for file in found.get('files', []):
+            if match_id in file.get('parents', []):
+                return folder_ids, file, None
+        return folder_ids, None, f"File '{file_name}' not found in folder '{parent_folder_path}'."
+
+    file, error = _find_file_in_folder(drive_service, parent_folder_path, file_name, parent_id=parent_id)
+    return folder_ids, file, error
+
+
 def get_file_by_name_anywhere(drive, file_name):
     """
     Finds a single file anywhere in the user's drive (used primarily by RENAME).
@@ -115,16 +752,16 @@ def get_file_by_name_anywhere(drive, file_name):
     try:
         # q: name='file_name' and mimeType!='folder' and trashed=false
         query = (
-            f"name='{file_name}' and mimeType!='application/vnd.google-apps.folder' "
+            f"name='{_q(file_name)}' and mimeType!='{FOLDER_MIMETYPE}' "
             f"and trashed=false"
         )
 
         response = drive.files().list(
             q=query,
             spaces='drive',
-            fields='files(id, name)',
+            fields='files(id)',
             pageSize=1
-        ).execute()
+        ).execute(num_retries=DRIVE_NUM_RETRIES)
 
         files = response.get('files', [])
 
@@ -139,6 +776,295 @@ def get_file_by_name_anywhere(drive, file_name):
         return None, f"An unknown error occurred: {e}"
 
 
+def _get_access_token(drive_service):
+    """Returns the bearer token the service's authorized transport is using (None if unavailable)."""
+    credentials = getattr(getattr(drive_service, '_http', None), 'credentials', None)
+    return getattr(credentials, 'token', None)
+
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def _docx_text(data):
+    """Reads the paragraphs of a DOCX file straight from its word/document.xml part."""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        root = ElementTree.fromstring(archive.read('word/document.xml'))
+    paragraphs = (
+        ''.join(node.text or '' for node in paragraph.iter(f'{_WORD_NS}t'))
+        for paragraph in root.iter(f'{_WORD_NS}p')
+    )
+    return '\n'.join(paragraph for paragraph in paragraphs if paragraph)
+
+
+def _xlsx_text(data):
+    """Reads the cell values of every sheet in an XLSX file, one tab-separated line per row."""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = archive.namelist()
+        shared_strings = []
+        if 'xl/sharedStrings.xml' in names:
+            root = ElementTree.fromstring(archive.read('xl/sharedStrings.xml'))
+            shared_strings = [
+                ''.join(node.text or '' for node in entry.iter(f'{_SHEET_NS}t'))
+                for entry in root.iter(f'{_SHEET_NS}si')
+            ]
+
+        lines = []
+        for name in sorted(n for n in names if n.startswith('xl/worksheets/sheet') and n.endswith('.xml')):
+            root = ElementTree.fromstring(archive.read(name))
+            for row in root.iter(f'{_SHEET_NS}row'):
+                values = []
+                for cell in row.iter(f'{_SHEET_NS}c'):
+                    cell_type = cell.get('t')
+                    if cell_type == 'inlineStr':
+                        values.append(''.join(node.text or '' for node in cell.iter(f'{_SHEET_NS}t')))
+                        continue
+                    value = cell.findtext(f'{_SHEET_NS}v') or ''
+                    if cell_type == 's' and value.isdigit() and int(value) < len(shared_strings):
+                        value = shared_strings[int(value)]
+                    values.append(value)
+                if any(values):
+                    lines.append('\t'.join(values))
+    return '\n'.join(lines)
+
+
+def _pdf_text(data):
+    """Extracts the text layer of a PDF, page by page."""
+    # Imported here so commands that never summarize don't pay for loading pypdf
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+def _extract_text(mime_type, data):
+    """
+    Turns a downloaded file into plain text for the prompt. Google-native docs arrive already exported as text;
+    DOCX/XLSX/PDF are parsed rather than decoded byte for byte, which would only feed the model markup and noise.
+    """
+    if mime_type == DOCX_MIMETYPE:
+        return _docx_text(data)
+    if mime_type == XLSX_MIMETYPE:
+        return _xlsx_text(data)
+    if mime_type == PDF_MIMETYPE:
+        return _pdf_text(data)
+    # Attempt to decode content, ignoring errors for robustness
+    return data.decode('utf-8', errors='ignore')
+
+
+def _download_item_text(drive_service, item, http=None):
+    """
+    Downloads one file through the API client (export for Google-native docs, raw media otherwise)
+    and decodes it as text. Used when the concurrent download of that file failed.
+    `http` overrides the service's transport, for callers running on worker threads.
+    """
+    # Use export_media to convert to plain text for supported file types
+    if item['mimeType'].startswith('application/vnd.google-apps'):
+        # Google native documents require the export method
+        request = drive_service.files().export_media(fileId=item['id'], mimeType='text/plain')
+    else:
+        # Non-native files (PDF, DOCX, text) use get_media
+        request = drive_service.files().get_media(fileId=item['id'])
+        if item['mimeType'] not in SUMMARY_DOCUMENT_MIMETYPES:
+            # Only the head of a text file can be used, so don't transfer more than that
+            request.headers['Range'] = f"bytes=0-{SUMMARY_MAX_FILE_BYTES - 1}"
+
+    # One request for the whole (capped) body; num_retries gives exponential backoff on 5xx/429 responses
+    content_bytes = request.execute(http=http, num_retries=DRIVE_NUM_RETRIES)
+
+    return _extract_text(item['mimeType'], content_bytes)
+
+
+def _download_item_text_on_worker(drive_service, item, credentials):
+    """Runs _download_item_text on a worker thread over that thread's reusable connection."""
+    http = getattr(_worker_http, 'http', None)
+    if http is None:
+        http = build_http()
+        _worker_http.http = http
+    return _download_item_text(drive_service, item, google_auth_httplib2.AuthorizedHttp(credentials, http=http))
+
+
+async def _fetch_item_bytes(session, access_token, item):
+    """Fetches one file's bytes from the Drive REST API (text/plain export for Google-native docs)."""
+    headers = {'Authorization': f"Bearer {access_token}"}
+    if item['mimeType'].startswith('application/vnd.google-apps'):
+        url = f"{DRIVE_FILES_URL}/{item['id']}/export"
+        params = {'mimeType': 'text/plain'}
+    else:
+        url = f"{DRIVE_FILES_URL}/{item['id']}"
+        params = {'alt': 'media'}
+        if item['mimeType'] not in SUMMARY_DOCUMENT_MIMETYPES:
+            # Media downloads honour Range, so large text files only transfer the part that can be used
+            headers['Range'] = f"bytes=0-{SUMMARY_MAX_FILE_BYTES - 1}"
+
+    async with session.get(url, params=params, headers=headers) as response:
+        response.raise_for_status()
+        return await response.read()
+
+
+async def _collect_texts(drive_service, items, access_token):
+    """
+    Downloads every item and extracts its text as one pipeline per file: a file's text is extracted on a
+    worker thread as soon as its download finishes, while the other downloads are still in flight, and a
+    transient failure is retried through the API client right away rather than after every download is done.
+    Returns one entry per item, in order: the text (head and tail, cut to SUMMARY_MAP_FILE_CHAR_BUDGET as soon as
+    it is extracted, so only that much of each file is held while the rest download), or the exception that ended
+    its attempts.
+    """
+    credentials = getattr(getattr(drive_service, '_http', None), 'credentials', None)
+    # Without credentials to open more connections, API client retries have to share the service's one
+    shared_transport_lock = asyncio.Lock()
+
+    async def download_via_api_client(item):
+        if credentials is None:
+            async with shared_transport_lock:
+                return await asyncio.to_thread(_download_item_text, drive_service, item)
+        # httplib2 is not thread-safe, so each worker thread downloads over its own authorized connection
+        return await asyncio.to_thread(_download_item_text_on_worker, drive_service, item, credentials)
+
+    async def collect(item):
+        return _head_and_tail(await fetch_text(item), SUMMARY_MAP_FILE_CHAR_BUDGET)
+
+    async def fetch_text(item):
+        if access_token:
+            try:
+                payload = await _fetch_item_bytes(session, access_token, item)
+            except aiohttp.ClientResponseError as e:
+                if e.status in (400, 403, 404):
+                    # Not downloadable/exportable; retrying through the API client would fail the same way
+                    raise
+                print(f"Concurrent download failed for {item['name']}, retrying via API client: {e}")
+            except Exception as e:
+                print(f"Concurrent download failed for {item['name']}, retrying via API client: {e}")
+            else:
+                return await asyncio.to_thread(_extract_text, item['mimeType'], payload)
+
+        # Transient failure (429/5xx, network), expired token or no token
+        return await download_via_api_client(item)
+
+    connector = aiohttp.TCPConnector(limit=SUMMARY_DOWNLOAD_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await asyncio.gather(*[collect(item) for item in items], return_exceptions=True)
+
+
+async def _fetch_range_to_file(session, access_token, file_id, start, end, fh):
+    """Downloads bytes start..end (inclusive) of a file's content and writes them at the same offset in fh."""
+    headers = {'Authorization': f"Bearer {access_token}", 'Range': f"bytes={start}-{end}"}
+    async with session.get(f"{DRIVE_FILES_URL}/{file_id}", params={'alt': 'media'}, headers=headers) as response:
+        response.raise_for_status()
+        if response.status != 206:
+            raise IOError(f"Range request for bytes {start}-{end} was not honoured (HTTP {response.status})")
+        offset = start
+        async for chunk in response.content.iter_chunked(1024 * 1024):
+            fh.seek(offset)
+            fh.write(chunk)
+            offset += len(chunk)
+    if offset != end + 1:
+        raise IOError(f"Range {start}-{end} ended early at byte {offset}")
+
+
+async def _download_ranges(file_id, size, access_token, fh):
+    """Downloads a file of known size into fh as DOWNLOAD_RANGE_BYTES ranges, several at a time."""
+    connector = aiohttp.TCPConnector(limit=DOWNLOAD_RANGE_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[
+            _fetch_range_to_file(
+                session, access_token, file_id, start, min(start + DOWNLOAD_RANGE_BYTES, size) - 1, fh
+            )
+            for start in range(0, size, DOWNLOAD_RANGE_BYTES)
+        ])
+
+
+def _ensure_summary_store():
+    """Creates the SQLite tables on first use (app.py only calls init_db when run directly)."""
+    global _summary_store_ready
+    if not _summary_store_ready:
+        db_manager.init_db()
+        _summary_store_ready = True
+
+
+def _load_stored_summary(key):
+    """Returns the summary stored under key, or None if there is none (or the store can't be read)."""
+    try:
+        _ensure_summary_store()
+        return db_manager.get_summary(key)
+    except Exception as e:
+        print(f"Could not read stored summary: {e}")
+        return None
+
+
+def _store_summary(key, summary):
+    """Saves a finished summary to the SQLite store; failures only cost a future cache miss."""
+    try:
+        _ensure_summary_store()
+        db_manager.save_summary(key, summary)
+    except Exception as e:
+        print(f"Could not store summary: {e}")
+
+
+def _head_and_tail(text, max_chars):
+    """Shortens text to about max_chars by keeping its beginning and its end."""
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}\n...[truncated]...\n{text[-half:]}"
+
+
+async def _summarize_documents(openai_api_key, documents):
+    """
+    Map step for folders too large for one prompt: condenses each (name, text) document on SUMMARY_MAP_MODEL,
+    SUMMARY_MAP_CONCURRENCY requests at a time. Returns one entry per document, in order:
+    the condensed text, or the exception raised for it.
+    """
+    # Imported here so commands that never summarize don't pay for loading openai/httpx/pydantic
+    from openai import AsyncOpenAI
+
+    semaphore = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+
+    # The SDK retries 429/5xx itself and honours Retry-After
+    async with AsyncOpenAI(api_key=openai_api_key, timeout=30.0, max_retries=3) as client:
+        async def summarize(name, text):
+            async with semaphore:
+                response = await client.chat.completions.create(
+                    model=SUMMARY_MAP_MODEL,
+                    messages=[{
+                        "role": "user",
+                        "content": (
+                            f"Summarize the document '{name}' in at most {SUMMARY_MAP_WORDS} words, "
+                            f"keeping its key facts, figures and conclusions.\n\n{text}"
+                        )
+                    }]
+                )
+            return response.choices[0].message.content or ''
+
+        return await asyncio.gather(
+            *[summarize(name, text) for name, text in documents],
+            return_exceptions=True
+        )
+
+
+def _get_openai_client(openai_api_key):
+    """Returns the shared OpenAI client for this API key, creating it on first use."""
+    client = _openai_clients.get(openai_api_key)
+    if client is None:
+        # Imported here so commands that never summarize don't pay for loading openai/httpx/pydantic
+        from openai import OpenAI
+
+        # The SDK retries 429/5xx itself and honours Retry-After
+        client = _openai_clients.setdefault(
+            openai_api_key,
+            OpenAI(api_key=openai_api_key, timeout=30.0, max_retries=3)
+        )
+    return client
+
+
+@atexit.register
+def _close_openai_clients():
+    """Closes the pooled OpenAI HTTP connections on interpreter exit."""
+    for client in _openai_clients.values():
+        client.close()
+
+
 # --- Core Drive Operations ---
 
 def list_files(drive_service, folder_path):
@@ -153,32 +1079,58 @@ def list_files(drive_service, folder_path):
 
     try:
         # Query for all files and folders that are children of the folder_id
-        query = f"'{folder_id}' in parents and trashed = false"
-
-        results = drive_service.files().list(
-            q=query,
-            fields="files(id, name, mimeType, size)",
-            spaces='drive'
-        ).execute()
+        # Folders don't report a size, so asking for it only costs bytes on files
+        list_kwargs = dict(
+            q=f"'{folder_id}' in parents and trashed = false",
+            fields="nextPageToken, files(id, name, mimeType, size)",
+            spaces='drive',
+            pageSize=1000
+        )
 
-        items = results.get('files', [])
+        # The subfolders listed here can only be cached while the changes feed is followed,
+        # so start it (in the same round trip as the first page) if this user has none yet
+        user_key = _cache_user_key(drive_service)
+        first_page = None
+        feed_live = _changes_feed_position(user_key) is not None
+        if not feed_live:
+            (first_page, list_error), token_outcome = _execute_batch(drive_service, [
+                drive_service.files().list(**list_kwargs),
+                drive_service.changes().getStartPageToken(fields='startPageToken')
+            ])
+            if list_error is not None:
+                raise list_error
+            feed_live = _start_changes_feed(user_key, *token_outcome)
+
+        items = _list_all_files(drive_service, first_page=first_page, **list_kwargs)
 
         if not items:
             return f"📂 Folder /{folder_path} is empty."
 
+        if feed_live:
+            _remember_child_folders(drive_service, folder_path, items)
+
         output = [f"📂 Contents of /{folder_path}:"]
         
-        for item in items:
-            is_folder = item['mimeType'] == 'application/vnd.google-apps.folder'
+        # Keep the WhatsApp reply short; the full listing is still fetched so the count below is right
+        for item in items[:LIST_DISPLAY_LIMIT]:
+            mime_type = item.get('mimeType', '')
+            label = (
+                MIME_LABELS.get(mime_type)
+                or MIME_PREFIX_LABELS.get(mime_type.partition('/')[0])
+                or '[FILE]'
+            )
             
-            if is_folder:
-                output.append(f"   {item['name']} ")
+            if mime_type == FOLDER_MIMETYPE:
+                output.append(f"  {label} {item['name']}")
             else:
                 # Format file size for readability
                 size_bytes = int(item.get('size', 0) or 0)
                 # Convert bytes to MB, ensuring clean division
                 size_str = f"{size_bytes / (1024 * 1024):.2f} MB" if size_bytes > 0 else "N/A"
-                output.append(f"  [FILE] {item['name']} ({size_str}) (ID: {item['id']})")
+                output.append(f"  {label} {item['name']} ({size_str}) (ID: {item['id']})")
+
+        if len(items) > LIST_DISPLAY_LIMIT:
+            output.append(f"  ...and {len(items) - LIST_DISPLAY_LIMIT} more items.")
                 
         return "\n".join(output)
 
@@ -188,17 +1140,37 @@ def list_files(drive_service, folder_path):
         return f"❌ An unexpected error occurred: {e}"
 
 
+def delete_files(drive_service, file_ids):
+    """
+    Deletes several files/folders by ID, MUTATION_BATCH_SIZE per batch request.
+    Returns one entry per ID, in order: None on success, or the HttpError for that item.
+    """
+    outcomes = _execute_batch(
+        drive_service,
+        [drive_service.files().delete(fileId=file_id) for file_id in file_ids],
+        batch_size=MUTATION_BATCH_SIZE
+    )
+    return [exception for _, exception in outcomes]
+
+
 def delete_file(drive_service, parent_folder_path, item_name):
     """
     Deletes a file (or non-empty folder, if found by the helper) from Google Drive using its path and name.
     """
-    # Use the helper to find the ID of the file to delete
-    # Note: get_file_id_by_name_and_path explicitly excludes folders, so this primarily deletes files.
-    item_id, error = get_file_id_by_name_and_path(drive_service, parent_folder_path, item_name)
+    # Resolve the parent folder, the "item is itself a folder" candidate and the file search together
+    # (cache misses and the search go out as one batch request instead of three sequential lookups)
+    # Note: the file search explicitly excludes folders, so this primarily deletes files.
+    candidate_folder_path = os.path.join(parent_folder_path, item_name).replace('\\', '/')
+    (parent_id, candidate_folder_id), item, error = _resolve_file_and_folders(
+        drive_service, parent_folder_path, item_name, [candidate_folder_path]
+    )
+    item_id = item['id'] if item else None
     
-    # If file not found, try to check if it's a folder
+    # If file not found, check if it's a folder
+    folder_path = None
     if not item_id:
-        folder_id = get_folder_id(drive_service, os.path.join(parent_folder_path, item_name).replace('\\', '/'))
+        folder_path = candidate_folder_path
+        folder_id = candidate_folder_id
         if folder_id:
             item_id = folder_id # Found a folder
         else:
@@ -206,7 +1178,12 @@ def delete_file(drive_service, parent_folder_path, item_name):
 
     try:
         # Simply calling delete with the item ID trashes the file/folder
-        drive_service.files().delete(fileId=item_id).execute()
+        error = delete_files(drive_service, [item_id])[0]
+        if error is not None:
+            raise error
+        if folder_path:
+            # The folder (and everything under it) is gone; don't serve its cached IDs any more
+            invalidate_folder_cache(drive_service, folder_path)
         return f"✅ Successfully deleted (trashed) item '{item_name}' (ID: {item_id})."
 
     except HttpError as error:
@@ -215,37 +1192,66 @@ def delete_file(drive_service, parent_folder_path, item_name):
         return f"❌ An unexpected error occurred during deletion: {e}"
 
 
+def move_files(drive_service, moves):
+    """
+    Moves several files, MUTATION_BATCH_SIZE per batch request. Each move is a (file_id, destination_folder_id) pair,
+    or (file_id, destination_folder_id, current_parent_ids) when the caller already knows the parents.
+    Returns one entry per move, in order: None on success, or the HttpError for that item.
+    """
+    # Retrieve the current parents (to know which ones to remove) only for files the caller didn't give them for
+    parents = [move[2] if len(move) > 2 else None for move in moves]
+    unknown = [position for position, file_parents in enumerate(parents) if file_parents is None]
+    parent_lookups = _execute_batch(
+        drive_service,
+        [drive_service.files().get(fileId=moves[position][0], fields='parents') for position in unknown]
+    )
+    errors = [None] * len(moves)
+    for position, (file, exception) in zip(unknown, parent_lookups):
+        if exception is None:
+            parents[position] = file.get('parents', [])
+        else:
+            errors[position] = exception
+
+    # Drive API update requires removing the old parents and adding the new ones
+    updates = []
+    positions = []
+    for position, move in enumerate(moves):
+        if errors[position] is None:
+            updates.append(drive_service.files().update(
+                fileId=move[0],
+                removeParents=','.join(parents[position]),
+                addParents=move[1],
+                fields='id'
+            ))
+            positions.append(position)
+
+    for position, (_, exception) in zip(positions, _execute_batch(drive_service, updates, batch_size=MUTATION_BATCH_SIZE)):
+        errors[position] = exception
+
+    return errors
+
+
 def move_file(drive_service, parent_folder_path, file_name, destination_folder_path):
     """
     Moves a file between two folders using its parent path, name, and the new destination path.
     """
-    # 1. Get the ID of the file to move
-    file_id, error = get_file_id_by_name_and_path(drive_service, parent_folder_path, file_name)
+    # 1. Resolve both folders and find the file to move inside the source folder, all in one batch request
+    # (the search returns its parents too, so the move itself is a single update call)
+    (source_id, destination_id), file, error = _resolve_file_and_folders(
+        drive_service, parent_folder_path, file_name, [destination_folder_path]
+    )
     
-    if not file_id:
+    if not file:
         return f"❌ Move failed: {error}"
 
-    # 2. Get the IDs of the current parent and the destination parent
-    # The current parent ID is not strictly needed for the API call but is good for verification
-    # current_parent_id = get_folder_id(drive_service, parent_folder_path) 
-    destination_id = get_folder_id(drive_service, destination_folder_path)
-
+    # 2. Check the destination parent resolved above
     if not destination_id:
         return f"❌ Move failed: Destination folder '{destination_folder_path}' not found."
 
     try:
-        # Retrieve the file's current parents to know which ones to remove
-        file = drive_service.files().get(fileId=file_id, fields='parents').execute()
-        
-        # Drive API update requires removing the old parents and adding the new ones
-        updated_file = drive_service.files().update(
-            fileId=file_id,
-            # String of IDs to remove (old parents)
-            removeParents=','.join(file['parents']),
-            # String of IDs to add (new parent)
-            addParents=destination_id,
-            fields='id, parents'
-        ).execute()
+        error = move_files(drive_service, [(file['id'], destination_id, file.get('parents', [source_id]))])[0]
+        if error is not None:
+            raise error
 
         return f"✅ Successfully moved '{file_name}' from /{parent_folder_path} to /{destination_folder_path}."
 
@@ -266,7 +1272,7 @@ def rename_file(drive, old_file_name, new_file_name):
             fileId=file_id,
             body=file_metadata,
             fields='id'
-        ).execute()
+        ).execute(num_retries=DRIVE_NUM_RETRIES)
 
         return f"✏️ Successfully renamed '{old_file_name}' to '{new_file_name}'."
 
@@ -294,11 +1300,18 @@ def upload_file(drive_service, folder_path, temp_file_path_full, drive_file_name
         target_parents = [folder_id]
         upload_location_msg = folder_path
 
-    if not os.path.exists(temp_file_path_full):
+    # One stat answers both "does it exist" and "is it big enough to need a resumable session"
+    try:
+        file_size = os.path.getsize(temp_file_path_full)
+    except OSError:
         return f"❌ Upload failed: Local file not found at path: {temp_file_path_full}"
     
-    mime = MimeTypes()
-    guessed_mime_type = mime.guess_type(drive_file_name)[0] or 'application/octet-stream'
+    ext = os.path.splitext(drive_file_name)[1].lower()
+    guessed_mime_type = (
+        _EXT_MIME.get(ext)
+        or mimetypes.guess_type(drive_file_name)[0]
+        or 'application/octet-stream'
+    )
 
     file_metadata = {
         'name': drive_file_name,
@@ -306,16 +1319,41 @@ def upload_file(drive_service, folder_path, temp_file_path_full, drive_file_name
     }
 
     try:
-        media = MediaFileUpload(temp_file_path_full, mimetype=guessed_mime_type, resumable=True)
+        resumable = file_size > RESUMABLE_UPLOAD_THRESHOLD
+        # chunksize only means something for resumable sessions
+        media_options = {'chunksize': UPLOAD_CHUNK_SIZE} if resumable else {}
+        media = MediaFileUpload(
+            temp_file_path_full,
+            mimetype=guessed_mime_type,
+            resumable=resumable,
+            **media_options
+        )
     except FileNotFoundError:
         return f"❌ Upload failed: Local file not found at path: {temp_file_path_full}"
     
     try:
-        uploaded_file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
+        try:
+            uploaded_file = drive_service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id'
+            ).execute(num_retries=DRIVE_NUM_RETRIES)
+        except HttpError as error:
+            if resumable or error.resp.status < 500:
+                raise
+            # The one-shot upload hit a server error: retry once as a resumable session, which can recover mid-transfer
+            print(f"Simple upload failed with {error.resp.status}, retrying as a resumable upload")
+            media = MediaFileUpload(
+                temp_file_path_full,
+                mimetype=guessed_mime_type,
+                resumable=True,
+                chunksize=UPLOAD_CHUNK_SIZE
+            )
+            uploaded_file = drive_service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id'
+            ).execute(num_retries=DRIVE_NUM_RETRIES)
 
         return f"✅ Successfully uploaded '{drive_file_name}' to /{upload_location_msg} (ID: {uploaded_file['id']})."
 
@@ -330,15 +1368,30 @@ def upload_file(drive_service, folder_path, temp_file_path_full, drive_file_name
 def download_file(drive_service, file_id, download_path):
     """
     Downloads a file from Google Drive using its ID to a specified local path.
+    Files larger than DOWNLOAD_RANGE_BYTES are fetched as concurrent byte ranges.
     """
     try:
+        access_token = _get_access_token(drive_service)
+        if access_token:
+            metadata = drive_service.files().get(fileId=file_id, fields='size').execute(num_retries=DRIVE_NUM_RETRIES)
+            size = int(metadata.get('size', 0) or 0)
+            if size > DOWNLOAD_RANGE_BYTES:
+                try:
+                    with open(download_path, 'wb') as fh:
+                        fh.truncate(size)
+                        asyncio.run(_download_ranges(file_id, size, access_token, fh))
+                    return f"✅ Successfully downloaded file ID {file_id} to local path: {download_path}"
+                except Exception as e:
+                    # Expired token, network trouble or no Range support: fall back to the API client below
+                    print(f"Ranged download failed for file ID {file_id}, retrying via API client: {e}")
+
         # Use MediaIoBaseDownload for the actual content
         request = drive_service.files().get_media(fileId=file_id)
-        fh = io.FileIO(download_path, 'wb')
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
+        with io.FileIO(download_path, 'wb') as fh:
+            downloader = MediaIoBaseDownload(fh, request)
+            done = False
+            while done is False:
+                status, done = downloader.next_chunk(num_retries=DRIVE_NUM_RETRIES)
         
         return f"✅ Successfully downloaded file ID {file_id} to local path: {download_path}"
     
@@ -348,71 +1401,118 @@ def download_file(drive_service, file_id, download_path):
         return f"❌ An unexpected error occurred during download: {e}"
 
 
-def summarize_folder(drive_service, folder_path, client, openai_model_name="gpt-4o"):
+def stream_folder_summary(drive_service, folder_path, openai_api_key, openai_model_name="gpt-4o"):
     """
     Finds all text-extractable files in a folder, concatenates their content, and generates a summary using OpenAI.
+    Generator: yields the header as soon as the model starts answering, then the summary text as it streams in.
     """
     folder_id = get_folder_id(drive_service, folder_path)
     
     if not folder_id:
-        return f"❌ Folder not found: {folder_path}"
+        yield f"❌ Folder not found: {folder_path}"
+        return
 
     try:
         # Query for exportable files in the folder
-        mime_query = ' or '.join([f"mimeType = '{m}'" for m in EXPORTABLE_MIMETYPES])
-        query = f"'{folder_id}' in parents and ({mime_query}) and trashed = false"
+        query = f"'{folder_id}' in parents and {EXPORTABLE_MIMETYPES_QUERY} and trashed = false"
 
-        results = drive_service.files().list(
+        # Newest first, and only as many pages as it takes to find SUMMARY_MAX_FILES usable files
+        listed = _iter_files(
+            drive_service,
             q=query,
-            fields="files(id, name, mimeType)",
-            spaces='drive'
-        ).execute()
+            fields="nextPageToken, files(id, name, mimeType, size, md5Checksum, modifiedTime)",
+            spaces='drive',
+            orderBy='modifiedTime desc',
+            pageSize=100
+        )
         
-        items = results.get('files', [])
+        items = []
+        for item in listed:
+            if item['mimeType'] in SUMMARY_DOCUMENT_MIMETYPES and int(item.get('size', 0) or 0) > SUMMARY_MAX_DOCUMENT_BYTES:
+                print(f"Skipping {item['name']} for summary: too large to download whole")
+                continue
+            if len(items) == SUMMARY_MAX_FILES:
+                print(f"Summarizing the newest {SUMMARY_MAX_FILES} files of /{folder_path}; older ones are left out")
+                break
+            items.append(item)
         
         if not items:
-            return f"⚠️ No extractable files (Docs, PDF, Sheets, etc.) found in /{folder_path} to summarize."
+            yield f"⚠️ No extractable files (Docs, PDF, Sheets, etc.) found in /{folder_path} to summarize."
+            return
+
+        # If none of the files changed since the last run, reuse that summary instead of re-downloading everything.
+        # md5Checksum only changes with the content; Google-native docs have none, so their modifiedTime is used.
+        file_versions = sorted(
+            (item['id'], item.get('md5Checksum') or item.get('modifiedTime', '')) for item in items
+        )
+        cache_key = hashlib.blake2b(
+            json.dumps([folder_id, openai_model_name, file_versions]).encode('utf-8')
+        ).hexdigest()
+        with _summary_cache_lock:
+            cached_summary = _summary_cache.get(cache_key)
+        if cached_summary is None:
+            cached_summary = _load_stored_summary(cache_key)
+        if cached_summary is not None:
+            with _summary_cache_lock:
+                _summary_cache[cache_key] = cached_summary
+            yield cached_summary
+            return
         
-        full_text = ""
+        max_chars = SUMMARY_TOTAL_CHAR_BUDGET
+        # Each readable file's text as (name, text), capped at SUMMARY_MAP_FILE_CHAR_BUDGET so memory stays bounded
+        documents = []
         file_list = []
-        
-        for item in items:
+        # Set when a file was skipped or stood in for by an excerpt for a reason that may not recur,
+        # in which case the summary is not cached (it would be served until a file changes)
+        incomplete = False
+
+        # Download and read every file at once; total wait is roughly the slowest file rather than the sum of all of them
+        texts = asyncio.run(_collect_texts(drive_service, items, _get_access_token(drive_service)))
+
+        for item, content in zip(items, texts):
             file_list.append(item['name'])
-            try:
-                # Use export_media to convert to plain text for supported file types
-                if item['mimeType'].startswith('application/vnd.google-apps'):
-                    # Google native documents require the export method
-                    request = drive_service.files().export_media(fileId=item['id'], mimeType='text/plain')
-                else:
-                    # Non-native files (PDF, DOCX) use get_media and are hoped to be simple enough to decode
-                    request = drive_service.files().get_media(fileId=item['id'])
-
-                fh = io.BytesIO()
-                downloader = MediaIoBaseDownload(fh, request)
-                done = False
-                while done is False:
-                    status, done = downloader.next_chunk()
-
-                # Attempt to decode content, ignoring errors for robustness
-                content = fh.getvalue().decode('utf-8', errors='ignore')
-
-                if content.strip():
-                    full_text += f"\n\n--- FILE: {item['name']} ---\n"
-                    full_text += content
-                
-            except HttpError as e:
-                 print(f"Error during Drive export/download for {item['name']} (may not be exportable): {e}")
-                 continue # Skip to the next file
-            except Exception as e:
-                print(f"Unexpected error processing file {item['name']}: {e}")
+            if isinstance(content, Exception) and _is_transient(content):
+                incomplete = True
+            if isinstance(content, (HttpError, aiohttp.ClientResponseError)):
+                print(f"Error during Drive export/download for {item['name']} (may not be exportable): {content}")
+                continue # Skip to the next file
+            if isinstance(content, Exception):
+                print(f"Unexpected error processing file {item['name']}: {content}")
                 continue
 
-        if not full_text.strip():
-            return f"⚠️ Could not extract any readable text from {len(file_list)} documents in /{folder_path}."
+            if content.strip():
+                documents.append((item['name'], content))
+
+        if not documents:
+            yield f"⚠️ Could not extract any readable text from {len(file_list)} documents in /{folder_path}."
+            return
+
+        sections = [f"\n\n--- FILE: {name} ---\n{text}" for name, text in documents]
+        if sum(len(section) for section in sections) > max_chars:
+            # Too much text for one prompt: condense each file on its own first, so each one is represented
+            # by a summary of its content rather than by whatever excerpt fits.
+            # Only as many files as there is room for in the prompt are condensed (items are newest first).
+            if len(documents) > SUMMARY_MAP_MAX_DOCUMENTS:
+                print(f"Summarizing {SUMMARY_MAP_MAX_DOCUMENTS} of {len(documents)} readable files in /{folder_path}")
+                documents = documents[:SUMMARY_MAP_MAX_DOCUMENTS]
+            condensed = asyncio.run(_summarize_documents(openai_api_key, documents))
+            # Each file gets an equal share of the budget, so one long note or excerpt can't crowd out the rest
+            per_file_chars = min(SUMMARY_PER_FILE_CHAR_BUDGET, max_chars // len(documents))
+            sections = []
+            for (name, text), file_summary in zip(documents, condensed):
+                header = f"\n\n--- FILE: {name} ---\n"
+                if isinstance(file_summary, Exception) or not file_summary.strip():
+                    # The map call failed: fall back to an excerpt of the file itself
+                    print(f"Could not condense {name} for the summary, using an excerpt instead: {file_summary}")
+                    file_summary = text
+                    incomplete = True
+                sections.append(header + _head_and_tail(file_summary, max(per_file_chars - len(header), 0)))
+
+        # The prompt names exactly the files whose content it contains
+        file_list = [name for name, _ in documents]
 
         # Truncate text to fit within typical model limits
-        max_chars = 20000
-        truncated_text = full_text[:max_chars]
+        truncated_text = "".join(sections)[:max_chars]
 
         # Call OpenAI API to summarize
         prompt = (
@@ -422,22 +1522,43 @@ def summarize_folder(drive_service, folder_path, client, openai_model_name="gpt-
             f"{', '.join(file_list)}\n\n--- Content (Truncated if > {max_chars} chars) ---\n{truncated_text}"
         )
 
-        chat_completion = client.chat.completions.create(
+        client = _get_openai_client(openai_api_key)
+        stream = client.chat.completions.create(
             model=openai_model_name,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            stream=True
         )
 
-        summary = chat_completion.choices[0].message.content
+        header = f"🤖 *AI Summary for /{folder_path}* ({len(file_list)} documents analyzed): \n\n"
+        yield header
 
-        return f"🤖 *AI Summary for /{folder_path}* ({len(file_list)} documents analyzed): \n\n{summary}"
+        parts = [header]
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ''
+            if delta:
+                parts.append(delta)
+                yield delta
+
+        summary = "".join(parts)
+        if incomplete:
+            print(f"Not caching the summary of /{folder_path}: some files could not be read or condensed this time")
+        else:
+            with _summary_cache_lock:
+                _summary_cache[cache_key] = summary
+            _store_summary(cache_key, summary)
 
     except HttpError as error:
-        return f"❌ An error occurred during Drive API call: {error}"
+        yield f"❌ An error occurred during Drive API call: {error}"
     except Exception as e:
         # Catch network or OpenAI API errors
-        return f"❌ An unexpected error occurred during summarization: {e}"
-
-
-
+        yield f"❌ An unexpected error occurred during summarization: {e}"
 
 
+def summarize_folder(drive_service, folder_path, openai_api_key, openai_model_name="gpt-4o"):
+    """
+    Non-streaming wrapper around stream_folder_summary: returns the whole summary message as one string.
+    Takes the OpenAI API key (as passed by app.py) and builds the client itself.
+    """
+    return "".join(stream_folder_summary(drive_service, folder_path, openai_api_key, openai_model_name))
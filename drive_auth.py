@@ -1,160 +1,527 @@
 import os
 import json
+import atexit
+import logging
 import firebase_admin
 from firebase_admin import firestore
 from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request
 # IMPORTANT: Need to import the Credentials object directly
 from google.oauth2.credentials import Credentials
-from urllib.parse import urlparse
-import base64
-from googleapiclient.discovery import build  # Using native Google API Client
+import hashlib
+import functools
+import datetime
+import threading
+import queue
+import concurrent.futures
+import requests
+import google_auth_httplib2
+from cryptography.fernet import Fernet, InvalidToken
+from cachetools import LRUCache, TTLCache
+from googleapiclient.discovery import build_from_document  # Using native Google API Client
+from googleapiclient import discovery_cache
+from googleapiclient.http import build_http
+
+# orjson parses the config blobs several times faster; the stdlib parser is the fallback.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so the error handling is the same either way.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Successes log at DEBUG/INFO and failures at WARNING/ERROR; with no logging configured only the latter reach stderr
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 DRIVE_SCOPE = ['https://www.googleapis.com/auth/drive']
+# Path of the OAuth callback route in app.py, appended to the public URL to form the redirect URI
+OAUTH_CALLBACK_PATH = "/oauth/callback"
 
 # Global variables (Initialized later)
 db = None
+_db_lock = threading.Lock()  # serializes the first initialize_firestore_client across worker threads
+_firebase_cert = None  # parsed service account credentials, kept so a retried initialization doesn't re-parse them
 client_secrets_json_data = {}
+# The OAuth client type ('web' or 'installed') and its section of the client secrets, set once they are parsed
+client_type = None
+client_config = {}
+
+# Token documents read from Firestore, kept for TOKEN_CACHE_TTL so a message doesn't cost a Firestore read:
+# {user_id: token_data}. store_credentials replaces a user's entry, so a re-auth takes effect immediately.
+TOKEN_CACHE_TTL = 900  # seconds
+_token_cache = TTLCache(maxsize=4096, ttl=TOKEN_CACHE_TTL)
+_token_cache_lock = threading.Lock()
+# Token documents mirrored by a Firestore realtime listener once they are first read: lookups stay local for as
+# long as the process runs, and a re-auth handled by another worker process arrives as a snapshot. Each listener
+# keeps a stream open, so only the first TOKEN_WATCH_LIMIT users are watched; the rest use the TTL cache.
+# Guarded by _token_cache_lock: {user_id: Watch} and {user_id: token_data, or None once the document is deleted}
+TOKEN_WATCH_LIMIT = 256
+_token_watches = {}
+_watched_tokens = {}
+# Token document writes (full sets on SETUP, token-field updates after a refresh) are cached right away and queued
+# for one writer thread. It hands everything queued so far to a Firestore BulkWriter and flushes it, so concurrent
+# OAuth completions go out as one pipelined round rather than one blocking RPC each. Drained at interpreter exit.
+# Queue items: (method, user_id, doc_ref, data), method being 'set' or 'update'; None stops the writer.
+BULK_WRITE_MAX_ATTEMPTS = 3
+_write_queue = queue.Queue()
+_writer_thread = None
+_writer_start_lock = threading.Lock()
+# The only fields load_credentials reads from a token document (the client ones are only on older documents)
+TOKEN_DOC_FIELDS = ['refresh_token', 'scopes', 'token', 'expiry', 'encrypted',
+                    'client_id', 'client_secret', 'token_uri']
+
+# --- Token Encryption ---
+# With DRIVE_TOKEN_KEY set (a Fernet key, see Fernet.generate_key()), the refresh and access tokens are stored
+# encrypted and the document is marked 'encrypted'. Documents written without a key still load as plain text.
+# A key that is set but invalid stops the app at import rather than quietly storing tokens unencrypted.
+ENCRYPTED_TOKEN_FIELDS = ('refresh_token', 'token')
+DRIVE_TOKEN_KEY = os.getenv('DRIVE_TOKEN_KEY')
+_fernet = None
+if DRIVE_TOKEN_KEY:
+    try:
+        _fernet = Fernet(DRIVE_TOKEN_KEY.encode('utf-8'))
+    except ValueError as e:
+        raise ValueError(f"DRIVE_TOKEN_KEY is not a valid Fernet key: {e}") from e
 
 # --- Firestore Paths and Secrets ---
 # Note: Using 'default-app-id' as __app_id is not available in local env
 app_id = os.getenv('__app_id', 'default-app-id')
-TEMP_DIR = os.getenv('TEMP_DIR', '/tmp')
-SECRETS_FILE_PATH = os.path.join(TEMP_DIR, 'client_secrets.json')
+# Raw config blobs, read from the environment once at import (they don't change while the process runs)
+FIREBASE_CONFIG_CONTENT = os.getenv('__firebase_config')
+GOOGLE_DRIVE_SECRETS_CONTENT = os.getenv('GOOGLE_DRIVE_SECRETS_CONTENT')
+# A user's token document lives at _TOKEN_PATH_PREFIX + user_id + _TOKEN_PATH_SUFFIX
+_TOKEN_PATH_PREFIX = f'artifacts/{app_id}/users/'
+_TOKEN_PATH_SUFFIX = '/tokens/drive_token'
+# load_client_secrets parses the secrets once per process; they are only ever kept in memory
+_secrets_lock = threading.Lock()
+
+# One keep-alive HTTP connection pool per worker thread, reused by every Drive service built on it
+# (httplib2 is not thread-safe, so threads never share one). Each thread also keeps the services it built.
+_thread_local = threading.local()
+# Drive services kept per worker thread, least recently used users dropped beyond this many
+THREAD_SERVICE_CACHE_SIZE = 256
+
+# Refreshed credentials per Drive user, reused until shortly before the access token expires:
+# {sha256(refresh_token): Credentials}, least recently used users dropped beyond CREDENTIALS_CACHE_SIZE
+CREDENTIALS_CACHE_SIZE = 4096
+_credentials_cache = LRUCache(maxsize=CREDENTIALS_CACHE_SIZE)
+_credentials_lock = threading.Lock()
+# google-auth treats a token as expired (and refreshes it on the next API call) once it is within
+# its REFRESH_THRESHOLD (3 min 45 s) of expiry, so the cached token is refreshed no later than that.
+TOKEN_REFRESH_MARGIN = 240  # seconds
+# Within TOKEN_PREFETCH_MARGIN of expiry the current token is still used, while a background thread refreshes it,
+# so a message only waits on Google's token endpoint when the token has (nearly) run out.
+TOKEN_PREFETCH_MARGIN = 600  # seconds
+_refresh_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='token-refresh')
+_refresh_in_flight = set()  # cache keys with a background refresh queued or running; guarded by _credentials_lock
+# One lock per user (cache key) around token refreshes, so concurrent requests that all find the token stale
+# refresh it once and the others pick up the result: {cache_key: Lock}, guarded by _credentials_lock
+_refresh_locks = LRUCache(maxsize=CREDENTIALS_CACHE_SIZE)
+# Users who used Drive within ACTIVE_USER_WINDOW: a loop checks them every TOKEN_REFRESH_LOOP_INTERVAL and refreshes
+# tokens nearing expiry ahead of time, so their next message finds a valid token even after a quiet spell.
+# {cache_key: (user_id, Credentials)}, guarded by _credentials_lock
+ACTIVE_USER_WINDOW = 3600  # seconds
+TOKEN_REFRESH_LOOP_INTERVAL = 60  # seconds
+_active_credentials = TTLCache(maxsize=CREDENTIALS_CACHE_SIZE, ttl=ACTIVE_USER_WINDOW)
+_refresh_loop_thread = None
+_refresh_loop_stop = threading.Event()
+
+# Token refreshes share one pooled requests.Session, so the connection to Google's token endpoint stays open
+# (a bare Request() opens a new session, and a new TLS handshake, for every refresh)
+_refresh_session = requests.Session()
+_refresh_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_refresh_request = Request(session=_refresh_session)
+
+# Drive v3 discovery document (bundled with googleapiclient), parsed once per process.
+# Building a service adjusts the parsed document in place, so builds from it are serialized.
+_drive_discovery_doc = None
+_discovery_lock = threading.Lock()
 
 
 # --- Helper Functions (Firestore Initialization) ---
 
 def initialize_firestore_client():
-    """Initializes the Firestore client and attempts to authenticate."""
-    global db
+    """
+    Initializes the Firestore client and attempts to authenticate.
+    Double-checked under _db_lock, so threads racing on a cold start initialize the app and client once.
+    """
+    global db, _firebase_cert
     if db is not None:
         return True
 
-    try:
-        if not firebase_admin._apps:
-            firebase_config_str = os.getenv('__firebase_config')
-            if not firebase_config_str:
-                print("FATAL: Firebase config not found in __firebase_config environment variable.")
-                return False
-
-            firebase_config = json.loads(firebase_config_str)
-            # The Admin SDK expects service account credentials directly, not the Firebase config object.
-            # Assuming __firebase_config contains service account credentials JSON.
-            cred = firebase_admin.credentials.Certificate(firebase_config)
-            firebase_admin.initialize_app(cred)
-
-        db = firestore.client()
-        print("Firestore client initialized successfully.")
-        return True
-    except Exception as e:
-        print(f"Error initializing Firestore: {e}")
-        return False
+    with _db_lock:
+        if db is not None:
+            return True
+
+        try:
+            if not firebase_admin._apps:
+                if _firebase_cert is None:
+                    firebase_config_str = FIREBASE_CONFIG_CONTENT
+                    if not firebase_config_str:
+                        logger.error("FATAL: Firebase config not found in __firebase_config environment variable.")
+                        return False
+
+                    firebase_config = _json_loads(firebase_config_str)
+                    # The Admin SDK expects service account credentials directly, not the Firebase config object.
+                    # Assuming __firebase_config contains service account credentials JSON.
+                    _firebase_cert = firebase_admin.credentials.Certificate(firebase_config)
+                firebase_admin.initialize_app(_firebase_cert)
+
+            db = firestore.client()
+            logger.info("Firestore client initialized successfully.")
+            return True
+        except Exception as e:
+            logger.error("Error initializing Firestore: %s", e)
+            return False
 
 
 def get_db():
     """Returns the initialized Firestore client, ensuring initialization first."""
-    if db is None:
-        initialize_firestore_client()
+    if db is not None:
+        return db
+    initialize_firestore_client()
     return db
 
 
+@functools.lru_cache(maxsize=4096)
+def _build_doc_ref(user_id):
+    """Builds (once per user) the reference to a user's token document; only called once db is initialized."""
+    return db.document(_TOKEN_PATH_PREFIX + user_id + _TOKEN_PATH_SUFFIX)
+
+
 def get_token_doc_ref(user_id):
     """Gets the Firestore Document Reference for a user's token."""
     if get_db():
-        return db.document(f'artifacts/{app_id}/users/{user_id}/tokens/drive_token')
+        return _build_doc_ref(user_id)
     return None
 
 
+def _encrypt_tokens(token_data):
+    """Encrypts the token fields of token_data in place when a DRIVE_TOKEN_KEY is configured."""
+    if _fernet is None:
+        return token_data
+    for field in ENCRYPTED_TOKEN_FIELDS:
+        if token_data.get(field):
+            token_data[field] = _fernet.encrypt(token_data[field].encode('utf-8')).decode('ascii')
+    token_data['encrypted'] = True
+    return token_data
+
+
+def _decrypt_tokens(token_data):
+    """Decrypts the token fields of a stored document in place; raises InvalidToken without the right key."""
+    if not token_data.pop('encrypted', False):
+        return token_data
+    if _fernet is None:
+        raise InvalidToken("token document is encrypted but DRIVE_TOKEN_KEY is not set")
+    for field in ENCRYPTED_TOKEN_FIELDS:
+        if token_data.get(field):
+            token_data[field] = _fernet.decrypt(token_data[field].encode('ascii')).decode('utf-8')
+    return token_data
+
+
+def _on_bulk_write_error(failure, bulk_writer):
+    """
+    BulkWriter error callback, called with the failure and the writer itself:
+    logs the failed write and retries it up to BULK_WRITE_MAX_ATTEMPTS times.
+    This is the only place a rejected write shows up (BulkWriter.flush doesn't raise for them),
+    so a write that runs out of attempts is logged as an error.
+    """
+    reference = getattr(failure.operation, 'reference', None)
+    path = reference.path if reference is not None else 'unknown document'
+    if failure.attempts < BULK_WRITE_MAX_ATTEMPTS:
+        logger.warning("Error writing token document %s (attempt %s): %s", path, failure.attempts, failure.message)
+        return True
+    # The cached copy keeps the user connected for now; once it expires they are asked to SETUP again
+    logger.error("Error writing token documents: %s not written after %s attempts: %s",
+                 path, failure.attempts, failure.message)
+    return False
+
+
+def _writer_loop():
+    """Writer thread: feeds queued token writes to one BulkWriter and flushes after each drained batch."""
+    writer = None
+    while True:
+        items = [_write_queue.get()]
+        while True:
+            try:
+                items.append(_write_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        writes = [item for item in items if item is not None]
+        try:
+            if writes:
+                if writer is None:
+                    writer = get_db().bulk_writer()
+                    writer.on_write_error(_on_bulk_write_error)
+                for method, user_id, doc_ref, data in writes:
+                    try:
+                        getattr(writer, method)(doc_ref, data)
+                    except Exception as e:
+                        logger.error("Error queueing token write for %s: %s", user_id, e)
+                writer.flush()
+                logger.debug("Token documents written: %d", len(writes))
+        except Exception as e:
+            logger.error("Error writing token documents: %s", e)
+        finally:
+            for _ in items:
+                _write_queue.task_done()
+
+        if len(writes) < len(items):
+            if writer is not None:
+                writer.close()
+            return
+
+
+def _queue_token_write(method, user_id, doc_ref, data):
+    """Queues a token document write for the writer thread, starting it on first use."""
+    global _writer_thread
+    if _writer_thread is None:
+        with _writer_start_lock:
+            if _writer_thread is None:
+                _writer_thread = threading.Thread(target=_writer_loop, name='token-writer', daemon=True)
+                _writer_thread.start()
+    _write_queue.put((method, user_id, doc_ref, data))
+
+
+def flush_credentials():
+    """Blocks until every queued token document write has been sent to Firestore."""
+    if _writer_thread is not None:
+        _write_queue.join()
+
+
+def _stop_writer():
+    """Drains the write queue and stops the writer thread (registered to run at exit)."""
+    if _writer_thread is not None and _writer_thread.is_alive():
+        _write_queue.put(None)
+        _writer_thread.join()
+
+
+atexit.register(_stop_writer)
+
+
 def store_credentials(user_id, credentials):
-    """Stores the Google Drive credentials (refresh token) for a user."""
+    """
+    Stores the Google Drive credentials (refresh token) for a user.
+    The token cache is updated immediately; the Firestore write is queued for the writer thread
+    (flush_credentials waits for it).
+    """
     doc_ref = get_token_doc_ref(user_id)
     if not doc_ref:
-        print(f"Error: Could not get Firestore document reference for storing credentials for user: {user_id}")
+        logger.error("Could not get Firestore document reference for storing credentials for user: %s", user_id)
         return
 
     try:
         if not credentials.refresh_token:
-            print(f"Skipping credential storage for {user_id}: No refresh token received.")
+            logger.warning("Skipping credential storage for %s: No refresh token received.", user_id)
             return
 
         token_data = {
-            # Storing the actual token data fields needed for reconstruction
+            # Storing the actual token data fields needed for reconstruction; the client id/secret and token URI
+            # are the app's, so build_drive_service takes them from the client secrets instead
             'refresh_token': credentials.refresh_token,
-            'client_id': credentials.client_id,
-            'client_secret': credentials.client_secret,
-            'token_uri': credentials.token_uri,
-            'scopes': credentials.scopes
+            'scopes': credentials.scopes,
+            # The access token from the exchange, so the first Drive call doesn't have to refresh it again
+            'token': credentials.token,
+            'expiry': _expiry_for_storage(credentials.expiry)
         }
-        doc_ref.set(token_data)
-        print(f"Credentials successfully stored for user: {user_id}")
+        with _token_cache_lock:
+            _token_cache[user_id] = dict(token_data)
+            if user_id in _watched_tokens:
+                _watched_tokens[user_id] = dict(token_data)
+        # A full set (not a merge) also drops the client fields that older documents still carry
+        _queue_token_write('set', user_id, doc_ref, _encrypt_tokens(token_data))
     except Exception as e:
-        print(f"Error storing credentials for {user_id}: {e}")
+        logger.error("Error storing credentials for %s: %s", user_id, e)
+
+
+def _token_snapshot_handler(user_id):
+    """Returns the on_snapshot callback that mirrors a user's token document into _watched_tokens."""
+    def on_snapshot(doc_snapshots, changes, read_time):
+        snapshot = doc_snapshots[0] if doc_snapshots else None
+        token_data = None
+        if snapshot is not None and snapshot.exists:
+            try:
+                token_data = _decrypt_tokens(snapshot.to_dict())
+            except InvalidToken as e:
+                logger.error("Error decrypting stored token for %s (check DRIVE_TOKEN_KEY): %s", user_id, e)
+        with _token_cache_lock:
+            if user_id in _watched_tokens:
+                _watched_tokens[user_id] = token_data
+    return on_snapshot
+
+
+def _watch_token_doc(user_id, doc_ref, token_data):
+    """Starts mirroring a user's token document (just read as token_data), unless the watch limit is reached."""
+    with _token_cache_lock:
+        if user_id in _token_watches or len(_token_watches) >= TOKEN_WATCH_LIMIT:
+            return
+        _token_watches[user_id] = None  # reserved; the listener is started outside the lock
+        _watched_tokens[user_id] = token_data
+
+    try:
+        watch = doc_ref.on_snapshot(_token_snapshot_handler(user_id))
+    except Exception as e:
+        logger.warning("Error watching token document for %s: %s", user_id, e)
+        with _token_cache_lock:
+            _token_watches.pop(user_id, None)
+            _watched_tokens.pop(user_id, None)
+        return
+    with _token_cache_lock:
+        _token_watches[user_id] = watch
+
+
+def shutdown_token_watches():
+    """Closes every token document listener (registered to run at exit)."""
+    with _token_cache_lock:
+        watches = [watch for watch in _token_watches.values() if watch is not None]
+        _token_watches.clear()
+        _watched_tokens.clear()
+    for watch in watches:
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            logger.warning("Error closing token document listener: %s", e)
+
+
+atexit.register(shutdown_token_watches)
 
 
 def load_credentials(user_id):
-    """Loads and rebuilds Google Drive credentials for a user."""
+    """
+    Loads and rebuilds Google Drive credentials for a user.
+    Served from the token document's realtime mirror once it has been read, or from the in-process token cache
+    when it was read within TOKEN_CACHE_TTL seconds. Only the first read goes to Firestore.
+    """
+    with _token_cache_lock:
+        if user_id in _watched_tokens:
+            return _watched_tokens[user_id]
+        token_data = _token_cache.get(user_id)
+    if token_data is not None:
+        return token_data
+
     doc_ref = get_token_doc_ref(user_id)
     if not doc_ref:
-        print(
-            f"Error: Could not get Firestore document reference for loading credentials for user: {user_id}. DB may be uninitialized.")
+        logger.error(
+            "Could not get Firestore document reference for loading credentials for user: %s. DB may be uninitialized.",
+            user_id)
         return None
 
     try:
-        print(f"Attempting to load token from path: {doc_ref.path}")
-        doc = doc_ref.get()
+        logger.debug("Attempting to load token from path: %s", doc_ref.path)
+        doc = doc_ref.get(field_paths=TOKEN_DOC_FIELDS)
         if doc.exists:
-            token_data = doc.to_dict()
-            print(f"Token loaded successfully for user: {user_id}. Scopes: {token_data.get('scopes')}")
+            try:
+                token_data = _decrypt_tokens(doc.to_dict())
+            except InvalidToken as e:
+                logger.error("Error decrypting stored token for %s (check DRIVE_TOKEN_KEY): %s", user_id, e)
+                return None
+            logger.debug("Token loaded successfully for user: %s. Scopes: %s", user_id, token_data.get('scopes'))
+            with _token_cache_lock:
+                _token_cache[user_id] = token_data
+            _watch_token_doc(user_id, doc_ref, token_data)
             return token_data
 
-        print(f"No token found for user: {user_id} at path: {doc_ref.path}")
+        logger.info("No token found for user: %s at path: %s", user_id, doc_ref.path)
         return None
     except Exception as e:
-        print(f"Error loading credentials for {user_id}: {e}")
+        logger.error("Error loading credentials for %s: %s", user_id, e)
         return None
 
 
-def write_secrets_to_file():
+def warm_token_cache(user_ids):
     """
-    Reads secrets from the environment variable and stores them globally,
-    then writes them to the file the library expects.
+    Reads the token documents of many users in one batched Firestore call (get_all streams them back over a
+    single RPC) and puts them in the token cache, e.g. at startup for users expected to message soon.
+    Returns how many users had a stored token.
     """
-    global client_secrets_json_data
-    secrets_content = os.getenv('GOOGLE_DRIVE_SECRETS_CONTENT')
-    if secrets_content:
-        try:
-            client_secrets_json_data = json.loads(secrets_content)
-            os.makedirs(TEMP_DIR, exist_ok=True)
-            with open(SECRETS_FILE_PATH, 'w') as f:
-                f.write(secrets_content)
+    database = get_db()
+    if not database or not user_ids:
+        return 0
+
+    refs_by_path = {}
+    for user_id in user_ids:
+        doc_ref = _build_doc_ref(user_id)
+        refs_by_path[doc_ref.path] = (user_id, doc_ref)
 
-            print(f"Successfully wrote secrets content to {SECRETS_FILE_PATH}")
+    warmed = 0
+    try:
+        refs = [doc_ref for _, doc_ref in refs_by_path.values()]
+        for snapshot in database.get_all(refs, field_paths=TOKEN_DOC_FIELDS):
+            if not snapshot.exists:
+                continue
+            user_id, _ = refs_by_path[snapshot.reference.path]
+            try:
+                token_data = _decrypt_tokens(snapshot.to_dict())
+            except InvalidToken as e:
+                logger.error("Error decrypting stored token for %s (check DRIVE_TOKEN_KEY): %s", user_id, e)
+                continue
+            with _token_cache_lock:
+                _token_cache[user_id] = token_data
+            warmed += 1
+    except Exception as e:
+        logger.error("Error warming token cache: %s", e)
+    logger.info("Token cache warmed for %d of %d users.", warmed, len(refs_by_path))
+    return warmed
+
+
+def load_client_secrets():
+    """
+    Reads secrets from the environment variable and stores them globally, parsing them once per process
+    (under a lock, so concurrent first calls don't race). The OAuth flows are built from this dict.
+    """
+    global client_secrets_json_data, client_type, client_config
+    if client_secrets_json_data:
+        return True
+
+    with _secrets_lock:
+        if client_secrets_json_data:
             return True
+
+        secrets_content = GOOGLE_DRIVE_SECRETS_CONTENT
+        if not secrets_content:
+            logger.error("FATAL: GOOGLE_DRIVE_SECRETS_CONTENT environment variable is missing.")
+            return False
+
+        try:
+            secrets = _json_loads(secrets_content)
         except json.JSONDecodeError as e:
-            print(f"FATAL Error parsing GOOGLE_DRIVE_SECRETS_CONTENT: {e}")
+            logger.error("FATAL Error parsing GOOGLE_DRIVE_SECRETS_CONTENT: %s", e)
             return False
-    else:
-        print("FATAL: GOOGLE_DRIVE_SECRETS_CONTENT environment variable is missing.")
-        return False
+
+        client_type = 'web' if 'web' in secrets else 'installed' if 'installed' in secrets else None
+        client_config = secrets[client_type] if client_type else {}
+        # Published last: a non-empty client_secrets_json_data is what tells other threads the secrets are loaded
+        client_secrets_json_data = secrets
+        return True
 
 
 # --- Core OAuth Functions ---
 
+def _redirect_uri(public_url):
+    """The OAuth redirect URI for a public URL (must match the one registered for the OAuth client)."""
+    return public_url + OAUTH_CALLBACK_PATH
+
+
+def _build_flow(public_url):
+    """
+    Builds an OAuth Flow from the in-memory client secrets, without reading them back from disk.
+    A Flow carries the state of one authorization (state, PKCE verifier, fetched token), so each call gets its own.
+    """
+    flow = Flow.from_client_config(client_secrets_json_data, scopes=DRIVE_SCOPE)
+    flow.redirect_uri = _redirect_uri(public_url) # Set redirect_uri on the flow object
+    return flow
+
+
 def generate_auth_url(public_url, encoded_user_id):
     """Generates the Google authorization URL, using encoded_user_id as state."""
 
-    if not write_secrets_to_file():
+    if not load_client_secrets():
         return None, "Error: Invalid or missing Google Drive secrets configuration."
 
     try:
-        flow = Flow.from_client_secrets_file(
-            SECRETS_FILE_PATH,
-            DRIVE_SCOPE
-        )
-        redirect_uri = public_url + "/oauth/callback"
-        flow.redirect_uri = redirect_uri # Set redirect_uri on the flow object
+        flow = _build_flow(public_url)
 
         auth_url, _ = flow.authorization_url(
             state=encoded_user_id,
@@ -166,74 +533,279 @@ def generate_auth_url(public_url, encoded_user_id):
         return auth_url, None
 
     except Exception as e:
-        print(f"Error generating auth URL: {e}")
+        logger.error("Error generating auth URL: %s", e)
         return None, f"Error generating auth URL: {e}"
 
 
 def exchange_code_for_token(auth_code, public_url):
     """Exchanges the authorization code for an access/refresh token."""
 
-    if not write_secrets_to_file():
+    if not load_client_secrets():
         return None, "Error: Invalid or missing Google Drive secrets configuration."
 
     try:
-        redirect_uri = public_url + "/oauth/callback"
-
-        flow = Flow.from_client_secrets_file(
-            SECRETS_FILE_PATH,
-            DRIVE_SCOPE
-        )
-        flow.redirect_uri = redirect_uri
+        flow = _build_flow(public_url)
 
         flow.fetch_token(code=auth_code)
 
         return flow.credentials, None
 
     except Exception as e:
-        print(f"Error exchanging code for token: {e}")
+        logger.error("Error exchanging code for token: %s", e)
         return None, f"Error exchanging code for token: {e}"
 
 
 # --- Utility for Drive API Calls ---
 
+def _get_thread_http():
+    """
+    Returns this thread's httplib2.Http, creating it on first use.
+    Reusing it across messages keeps the TCP/TLS session to Google open instead of reconnecting every time.
+    """
+    http = getattr(_thread_local, 'http', None)
+    if http is None:
+        # build_http applies the client library's defaults (timeout, no 308 redirects for resumable uploads)
+        http = build_http()
+        _thread_local.http = http
+    return http
+
+
+def _get_thread_services():
+    """Returns this thread's Drive services (an LRU of THREAD_SERVICE_CACHE_SIZE), keyed like _credentials_cache."""
+    services = getattr(_thread_local, 'services', None)
+    if services is None:
+        services = LRUCache(maxsize=THREAD_SERVICE_CACHE_SIZE)
+        _thread_local.services = services
+    return services
+
+
+def _build_drive(http):
+    """Builds a Drive v3 service on the given transport from the once-parsed discovery document."""
+    global _drive_discovery_doc
+    with _discovery_lock:
+        if _drive_discovery_doc is None:
+            _drive_discovery_doc = _json_loads(discovery_cache.get_static_doc('drive', 'v3'))
+        return build_from_document(_drive_discovery_doc, http=http)
+
+
+def _expiry_for_storage(expiry):
+    """
+    google-auth's naive UTC expiry as an aware datetime, which Firestore stores as a native timestamp
+    (no string formatting on write, no parsing on read).
+    """
+    if expiry is None:
+        return None
+    return expiry.replace(tzinfo=datetime.timezone.utc)
+
+
+def _stored_expiry(token_data):
+    """The stored access token expiry as the naive UTC datetime google-auth uses, or None."""
+    expiry = token_data.get('expiry')
+    if not expiry:
+        return None
+    if isinstance(expiry, datetime.datetime):
+        # Firestore timestamps come back as aware UTC datetimes
+        return expiry.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    try:
+        # Documents written before expiries were stored as timestamps hold an ISO string
+        return datetime.datetime.fromisoformat(expiry)
+    except (TypeError, ValueError):
+        return None
+
+
+def _needs_refresh(creds, margin=TOKEN_REFRESH_MARGIN):
+    """
+    True when creds has no access token yet, google-auth considers it expired,
+    or it expires within margin seconds.
+    """
+    if not creds.token or creds.expiry is None or not creds.valid:
+        return True
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now < datetime.timedelta(seconds=margin)
+
+
+def _remember_refreshed_token(user_id, creds):
+    """
+    Copies a refreshed access token and expiry into the user's cached token document, so credentials rebuilt
+    from it (after the credentials cache dropped the user) start from the fresh token instead of refreshing again.
+    Updated in place, which keeps the entry's original TTL.
+    """
+    with _token_cache_lock:
+        for token_data in (_watched_tokens.get(user_id), _token_cache.get(user_id)):
+            if token_data is not None and token_data.get('refresh_token') == creds.refresh_token:
+                token_data['token'] = creds.token
+                token_data['expiry'] = _expiry_for_storage(creds.expiry)
+
+
+def store_refreshed_access_token(user_id, creds):
+    """
+    Records a refreshed access token: in the cached token document right away, and in Firestore with an
+    update of just the token fields (the rest of the document is unchanged) in the background.
+    """
+    _remember_refreshed_token(user_id, creds)
+    doc_ref = get_token_doc_ref(user_id)
+    if not doc_ref:
+        return
+
+    fields = {
+        'token': creds.token,
+        'expiry': _expiry_for_storage(creds.expiry)
+    }
+    if _fernet is not None:
+        # Rewrite the refresh token too, so the document is encrypted throughout even if it was stored in the clear
+        fields['refresh_token'] = creds.refresh_token
+    # Not fatal if it fails: the stored token is only a head start, the refresh token still works
+    _queue_token_write('update', user_id, doc_ref, _encrypt_tokens(fields))
+
+
+def _refresh_lock(cache_key):
+    """Returns the lock that single-flights token refreshes for one user."""
+    with _credentials_lock:
+        lock = _refresh_locks.get(cache_key)
+        if lock is None:
+            lock = threading.Lock()
+            _refresh_locks[cache_key] = lock
+        return lock
+
+
+def _refresh_once(user_id, cache_key, creds, margin=TOKEN_REFRESH_MARGIN):
+    """
+    Refreshes the user's token unless a concurrent refresh already did, and returns the fresh credentials:
+    either creds, refreshed, or the credentials another request refreshed and cached while this one waited.
+    """
+    with _refresh_lock(cache_key):
+        with _credentials_lock:
+            cached = _credentials_cache.get(cache_key)
+        if cached is not None and not _needs_refresh(cached, margin):
+            return cached
+        if not _needs_refresh(creds, margin):
+            return creds
+        creds.refresh(_refresh_request)
+        store_refreshed_access_token(user_id, creds)
+        with _credentials_lock:
+            _credentials_cache[cache_key] = creds
+        return creds
+
+
+def _background_refresh(user_id, cache_key, creds):
+    """Refreshes creds in place off the request path; services built on creds pick up the new token."""
+    try:
+        _refresh_once(user_id, cache_key, creds, TOKEN_PREFETCH_MARGIN)
+    except Exception as e:
+        # The next message refreshes inline once the token is actually about to expire
+        logger.warning("Background token refresh failed: %s", e)
+    finally:
+        with _credentials_lock:
+            _refresh_in_flight.discard(cache_key)
+
+
+def _schedule_refresh(user_id, cache_key, creds):
+    """Queues a background refresh of creds, unless one is already queued or running for this user."""
+    with _credentials_lock:
+        if cache_key in _refresh_in_flight:
+            return
+        _refresh_in_flight.add(cache_key)
+    _refresh_executor.submit(_background_refresh, user_id, cache_key, creds)
+
+
+def _refresh_loop():
+    """Background loop: schedules a refresh for each active user whose token is within TOKEN_PREFETCH_MARGIN."""
+    while not _refresh_loop_stop.wait(TOKEN_REFRESH_LOOP_INTERVAL):
+        with _credentials_lock:
+            active = [(key, _active_credentials.get(key)) for key in list(_active_credentials)]
+        for cache_key, entry in active:
+            if entry is None:
+                continue
+            user_id, creds = entry
+            if creds.refresh_token and _needs_refresh(creds, TOKEN_PREFETCH_MARGIN):
+                _schedule_refresh(user_id, cache_key, creds)
+
+
+def _start_refresh_loop():
+    """Starts the background refresh loop on first use."""
+    global _refresh_loop_thread
+    if _refresh_loop_thread is not None:
+        return
+    with _credentials_lock:
+        if _refresh_loop_thread is not None:
+            return
+        _refresh_loop_thread = threading.Thread(target=_refresh_loop, name='token-refresh-loop', daemon=True)
+    _refresh_loop_thread.start()
+
+
+atexit.register(_refresh_loop_stop.set)
+
+
 def build_drive_service(user_id):
     """
     Builds the Google Drive API service object (native API).
-    This function is unchanged from your working version.
+    Credentials are refreshed only when their access token is about to expire (in the background while it is
+    still usable, or ahead of time for recently active users), and each worker thread reuses the service it built
+    for the same user.
     """
     token_data = load_credentials(user_id)
     if not token_data:
         return None, "Drive not connected. Send 'SETUP' first."
 
     # 1. Ensure secrets are loaded to get client_id/secret for reconstruction
-    if not client_secrets_json_data and not write_secrets_to_file():
+    if not load_client_secrets():
         return None, "Failed to load client configuration."
 
     try:
-
-        # 2. Reconstruct Credentials object using the data loaded from Firestore
-        creds = Credentials(
-            token=None,  # Token is dynamic, we use the refresh token
-            refresh_token=token_data.get('refresh_token'),
-            # The following required fields come from the stored token data
-            client_id=token_data.get('client_id'),
-            client_secret=token_data.get('client_secret'),
-            token_uri=token_data.get('token_uri'),
-            scopes=token_data.get('scopes')
-        )
-
-        # 3. Request a fresh access token using the refresh token
+        refresh_token = token_data.get('refresh_token') or ''
+        cache_key = hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+        # 2. Reuse this user's credentials from an earlier message, or reconstruct them from the Firestore data
+        with _credentials_lock:
+            creds = _credentials_cache.get(cache_key)
+        if creds is None:
+            creds = Credentials(
+                # The stored access token is used while it's still valid; otherwise it is refreshed below
+                token=token_data.get('token'),
+                expiry=_stored_expiry(token_data),
+                refresh_token=token_data.get('refresh_token'),
+                # The client fields come from the app's client secrets; documents written before they were
+                # dropped from storage still carry their own, which are kept since the refresh token was issued to them
+                client_id=token_data.get('client_id') or client_config.get('client_id'),
+                client_secret=token_data.get('client_secret') or client_config.get('client_secret'),
+                token_uri=token_data.get('token_uri') or client_config.get('token_uri'),
+                scopes=token_data.get('scopes')
+            )
+
+        # 3. Request a fresh access token using the refresh token, unless the current one is still good
         # This uses the Request object correctly to refresh the token
-        creds.refresh(Request())
-
-        # 4. Build the Drive Service (native googleapiclient)
-        service = build('drive', 'v3', credentials=creds)
+        if _needs_refresh(creds):
+            creds = _refresh_once(user_id, cache_key, creds)
+        elif _needs_refresh(creds, TOKEN_PREFETCH_MARGIN):
+            _schedule_refresh(user_id, cache_key, creds)
+        with _credentials_lock:
+            _credentials_cache[cache_key] = creds
+            _active_credentials[cache_key] = (user_id, creds)
+        _start_refresh_loop()
+
+        # 4. Build the Drive Service (native googleapiclient) on this thread's reusable connection, once per user.
+        # The discovery document ships with the client library, so nothing is fetched or cached on disk.
+        services = _get_thread_services()
+        service = services.get(cache_key)
+        if service is None or service._http.credentials is not creds:
+            authorized_http = google_auth_httplib2.AuthorizedHttp(creds, http=_get_thread_http())
+            service = _build_drive(authorized_http)
+            services[cache_key] = service
         return service, None
 
     except Exception as e:
-        print(f"Error building credentials or Drive service: {e}")
+        logger.error("Error building credentials or Drive service: %s", e)
         return None, f"Error building credentials or Drive service: '{e}'"
 
 
-# Ensure Firestore is initialized on load
-initialize_firestore_client()
+def eager_init():
+    """
+    Connects to Firestore and parses the client secrets now rather than on first use,
+    for callers that want startup to fail fast. Returns True when both succeed.
+    """
+    return initialize_firestore_client() and load_client_secrets()
+
+
+# The client secrets are parsed on load (no I/O); Firestore connects lazily on first use via get_db()
+load_client_secrets()
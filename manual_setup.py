@@ -2,6 +2,13 @@ from db_manager import init_db, save_user_token
 import json
 import os
 
+# orjson parses from bytes directly; the stdlib parser is the fallback
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # Ensure the database is initialized
 init_db()
 
@@ -10,8 +17,11 @@ TEST_WHATSAPP_NUMBER = 'whatsapp:+15551234567' # Use the number from your cURL t
 CREDS_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mycreds.json')
 
 try:
-    with open(CREDS_FILE_PATH, 'r') as f:
-        data = json.load(f)
+    with open(CREDS_FILE_PATH, 'rb') as f:
+        # Fail fast on an empty file instead of with a parser error
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{CREDS_FILE_PATH} is empty")
+        data = _json_loads(f.read())
         user_refresh_token = data.get('refresh_token')
 
     if user_refresh_token:
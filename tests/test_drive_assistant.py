@@ -0,0 +1,39 @@
+import unittest
+
+import drive_assistant_v2
+
+
+class QueryEscapeTests(unittest.TestCase):
+    """_q: user-supplied names inside single-quoted Drive query literals."""
+
+    def test_plain_name_is_unchanged(self):
+        self.assertEqual(drive_assistant_v2._q("Reports 2025.pdf"), "Reports 2025.pdf")
+
+    def test_single_quote_is_escaped(self):
+        self.assertEqual(drive_assistant_v2._q("O'Brien report.pdf"), "O\\'Brien report.pdf")
+
+    def test_backslash_is_escaped(self):
+        self.assertEqual(drive_assistant_v2._q("a\\b"), "a\\\\b")
+
+    def test_backslash_before_quote_cannot_close_the_literal(self):
+        self.assertEqual(drive_assistant_v2._q("x\\' or name != '"), "x\\\\\\' or name != \\'")
+
+    def test_control_characters_are_dropped(self):
+        self.assertEqual(drive_assistant_v2._q("a\nb\tc\x00d\x7f"), "abcd")
+
+
+class RootFolderPathTests(unittest.TestCase):
+    """get_folder_id: paths with no segments are the Drive root and need no Drive call."""
+
+    def test_empty_path_is_root(self):
+        self.assertEqual(drive_assistant_v2.get_folder_id(object(), ''), 'root')
+
+    def test_slash_is_root(self):
+        self.assertEqual(drive_assistant_v2.get_folder_id(object(), '/'), 'root')
+
+    def test_repeated_slashes_are_root(self):
+        self.assertEqual(drive_assistant_v2.get_folder_id(object(), '///'), 'root')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import logging
+import types
+import unittest
+
+import drive_auth
+
+
+def _write_failure(attempts):
+    """A stand-in for BulkWriteFailure: the failed operation (with its document reference) and the error."""
+    reference = types.SimpleNamespace(path='artifacts/default-app-id/users/15551234567/tokens/drive')
+    operation = types.SimpleNamespace(reference=reference, attempts=attempts)
+    return types.SimpleNamespace(operation=operation, code=14, message='unavailable', attempts=attempts)
+
+
+class BulkWriteErrorCallbackTests(unittest.TestCase):
+    """_on_bulk_write_error, called as BulkWriter calls it: callback(failure, bulk_writer)."""
+
+    def test_failed_write_is_logged_and_retried(self):
+        with self.assertLogs(drive_auth.logger, logging.WARNING) as logs:
+            retry = drive_auth._on_bulk_write_error(_write_failure(1), object())
+        self.assertTrue(retry)
+        self.assertIn('users/15551234567/tokens/drive', logs.output[0])
+
+    def test_failed_write_is_logged_as_a_warning_while_it_is_retried(self):
+        with self.assertLogs(drive_auth.logger, logging.WARNING) as logs:
+            drive_auth._on_bulk_write_error(_write_failure(1), object())
+        self.assertEqual(logs.records[0].levelno, logging.WARNING)
+
+    def test_last_attempt_is_logged_as_an_error_and_not_retried(self):
+        with self.assertLogs(drive_auth.logger, logging.WARNING) as logs:
+            retry = drive_auth._on_bulk_write_error(_write_failure(drive_auth.BULK_WRITE_MAX_ATTEMPTS), object())
+        self.assertFalse(retry)
+        self.assertEqual(logs.records[0].levelno, logging.ERROR)
+        self.assertIn('Error writing token documents', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()